@@ -9,7 +9,7 @@ LOG2 = np.log(2.0)
 LIKELIHOOD_FLOOR = -np.inf
 LOCAL_LIKELIHOOD_FLOOR = -1.0e8
 FOUR_PI = 4.0 * np.pi
-MAG_FAC = 100.0**0.2
+MAG_FAC = 2.5
 AB_OFFSET = -48.60
 MPC_CGS = (1.0 * u.Mpc).cgs.value
 DAY_CGS = (1.0 * u.day).cgs.value
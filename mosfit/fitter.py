@@ -13,7 +13,8 @@ import numpy as np
 from schwimmbad import MPIPool, SerialPool
 
 from mosfit.constants import LIKELIHOOD_FLOOR
-from mosfit.utils import pretty_num, print_inline, print_wrapped, prompt
+from mosfit.utils import (bcast_arrays, json_default, pretty_num,
+                          print_inline, print_wrapped, prompt)
 
 from .model import Model
 
@@ -40,6 +41,40 @@ def frack(x):
     return model.frack(x)
 
 
+def batch_map(args):
+    """Apply a function to a chunk of walkers. If the function is emcee's
+    likelihood/prior wrapper, evaluate the whole chunk in one batched call.
+    """
+    func, chunk = args
+    if not (hasattr(func, 'logl') and hasattr(func, 'logp')):
+        return [func(x) for x in chunk]
+    xs = np.array(chunk)
+    lp = np.asarray(func.logp(xs, *func.logpargs, **func.logpkwargs))
+    ll = np.full(len(xs), -np.inf)
+    good = lp != -np.inf
+    if np.any(good):
+        ll[good] = func.logl(xs[good], *func.loglargs, **func.loglkwargs)
+    return list(zip(np.where(good, ll, lp), lp))
+
+
+class BatchPool(object):
+    """Pool wrapper that hands each process a chunk of walkers to evaluate
+    at once, rather than dispatching walkers one at a time.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.size = pool.size
+
+    def map(self, func, iterable):
+        items = list(iterable)
+        nchunks = max(min(self.size, len(items)), 1)
+        bounds = np.linspace(0, len(items), nchunks + 1).astype(int)
+        chunks = [(func, items[bounds[i]:bounds[i + 1]])
+                  for i in range(nchunks)]
+        return [y for x in self._pool.map(batch_map, chunks) for y in x]
+
+
 class Fitter():
     """Fit transient events with the provided model.
     """
@@ -67,7 +102,8 @@ class Fitter():
                    post_burn=500,
                    smooth_times=-1,
                    extrapolate_time=0.0,
-                   suffix=''):
+                   suffix='',
+                   profile=False):
         dir_path = os.path.dirname(os.path.realpath(__file__))
         self._travis = travis
         self._wrap_length = wrap_length
@@ -156,14 +192,17 @@ class Fitter():
                             self._wrap_length)
                         raise RuntimeError
 
-                    for rank in range(1, pool.size + 1):
-                        pool.comm.send(self._event_name, dest=rank, tag=0)
-                        pool.comm.send(path, dest=rank, tag=1)
-                        pool.comm.send(data, dest=rank, tag=2)
+                    if pool.size:
+                        bcast_arrays(pool, [
+                            np.frombuffer(
+                                json.dumps([self._event_name, path, data])
+                                .encode('utf-8'),
+                                dtype=np.uint8)
+                        ])
                 else:
-                    self._event_name = pool.comm.recv(source=0, tag=0)
-                    path = pool.comm.recv(source=0, tag=1)
-                    data = pool.comm.recv(source=0, tag=2)
+                    payload = bcast_arrays(pool)[0].tobytes().decode('utf-8')
+                    self._event_name, path, data = json.loads(
+                        payload, object_pairs_hook=OrderedDict)
                     pool.wait()
 
                 if pool.is_master():
@@ -179,7 +218,8 @@ class Fitter():
                         model=mod_name,
                         parameter_path=parameter_path,
                         wrap_length=wrap_length,
-                        pool=pool)
+                        pool=pool,
+                        profile=profile)
 
                     if not event:
                         print('No event specified, generating dummy data.')
@@ -238,6 +278,10 @@ class Fitter():
         of emcee and fracking.
         """
         fixed_parameters = []
+        bands = [(x, band_instruments[i] if i < len(band_instruments) else '',
+                  band_bandsets[i] if i < len(band_bandsets) else '',
+                  band_systems[i] if i < len(band_systems) else '')
+                 for i, x in enumerate(band_list)]
         for task in self._model._call_stack:
             cur_task = self._model._call_stack[task]
             self._model._modules[task].set_event_name(event_name)
@@ -254,6 +298,11 @@ class Fitter():
                     band_bandsets=band_bandsets)
                 fixed_parameters.extend(self._model._modules[task]
                                         .get_data_determined_parameters())
+                bands.extend(self._model._modules[task].get_observed_bands())
+
+        # Only read the filters of bands in the data, or requested by the
+        # user.
+        self._model.load_filters(bands)
 
         self._model.determine_free_parameters(fixed_parameters)
 
@@ -283,6 +332,9 @@ class Fitter():
 
         global model
         model = self._model
+        profiler = model.profiler()
+        phases = OrderedDict([('initial draws', 0.0), ('sampler', 0.0),
+                              ('fracking', 0.0)])
 
         if not pool.is_master():
             try:
@@ -293,6 +345,7 @@ class Fitter():
 
         ntemps, ndim, nwalkers = (num_temps, model._num_free_parameters,
                                   num_walkers)
+        batch_pool = BatchPool(pool)
 
         test_walker = iterations > 0
         lnprob = None
@@ -301,6 +354,7 @@ class Fitter():
         print('{} dimensions in problem.\n\n'.format(ndim))
         p0 = [[] for x in range(ntemps)]
 
+        pst = time.time()
         for i, pt in enumerate(p0):
             while len(p0[i]) < nwalkers:
                 self.print_status(
@@ -308,10 +362,12 @@ class Fitter():
                     progress=[i * nwalkers + len(p0[i]), nwalkers * ntemps])
 
                 nmap = nwalkers - len(p0[i])
-                p0[i].extend(pool.map(draw_walker, [test_walker] * nmap))
+                p0[i].extend(
+                    batch_pool.map(draw_walker, [test_walker] * nmap))
+        phases['initial draws'] += time.time() - pst
 
         sampler = emcee.PTSampler(
-            ntemps, nwalkers, ndim, likelihood, prior, pool=pool)
+            ntemps, nwalkers, ndim, likelihood, prior, pool=batch_pool)
 
         print_inline('Initial draws completed!')
         print('\n\n')
@@ -333,6 +389,7 @@ class Fitter():
                     loop_step = iterations - self._burn_in
                 emi = 0
                 st = time.time()
+                pst = st
                 for p, lnprob, lnlike in sampler.sample(
                         p, iterations=min(loop_step, iterations)):
                     # Redraw bad walkers
@@ -359,6 +416,7 @@ class Fitter():
                         scores=[max(x) for x in lnprob],
                         progress=[prog, iterations],
                         acor=acor)
+                phases['sampler'] += time.time() - pst
                 if fracking and b >= bmax:
                     break
                 if fracking and b < bmax:
@@ -400,6 +458,7 @@ class Fitter():
                         if -bh.fun > lnprob[selijs[bhi][0]][selijs[bhi][1]]:
                             p[selijs[bhi][0]][selijs[bhi][1]] = bh.x
                     self._bh_est_t = float(time.time() - st) * (bmax - b - 1)
+                    phases['fracking'] += time.time() - st
                     scores = [-x.fun for x in bhs]
                     self.print_status(
                         desc='Running Fracking',
@@ -415,9 +474,29 @@ class Fitter():
         except:
             raise
 
-        walkers_out = OrderedDict()
+        # Generate the profile report before the output stack is run below,
+        # so that only the fitting itself is accounted for.
+        if profiler:
+            notes = []
+            if pool.size > 0:
+                notes.append('Note: Module timings only include evaluations '
+                             'performed by the master process.')
+            if np.any(model._par_mapped):
+                notes.append('Note: Free parameters are mapped to their '
+                             'values together, their module calls are timed '
+                             'under `Model.parameter_values`.')
+            report = profiler.report(
+                phases=phases,
+                title='Profile of `{}` fit with model `{}`'.format(
+                    self._event_name, model._model_name),
+                notes=notes)
+
+        walkers_out = OrderedDict(
+            enumerate(model.run_walkers(np.array(p[0]), root='output')))
         for xi, x in enumerate(p[0]):
-            walkers_out[xi] = model.run_stack(x, root='output')
+            for task in model._call_stack:
+                if model._call_stack[task]['kind'] == 'data':
+                    model._modules[task].blank_missing(walkers_out[xi])
             if lnprob is not None:
                 walkers_out[xi]['score'] = lnprob[0][xi]
             parameters = OrderedDict()
@@ -445,8 +524,18 @@ class Fitter():
                       os.path.join(model.MODEL_OUTPUT_DIR, self._event_name + (
                           ('_' + suffix)
                           if suffix else '') + '.json'), 'w') as f:
-            json.dump(walkers_out, flast, indent='\t', separators=(',', ':'))
-            json.dump(walkers_out, f, indent='\t', separators=(',', ':'))
+            json.dump(walkers_out, flast, indent='\t', separators=(',', ':'),
+                      default=json_default)
+            json.dump(walkers_out, f, indent='\t', separators=(',', ':'),
+                      default=json_default)
+
+        if profiler:
+            print('\n\n' + report)
+            with open(
+                    os.path.join(model.MODEL_OUTPUT_DIR, self._event_name + (
+                        ('_' + suffix)
+                        if suffix else '') + '_profile.txt'), 'w') as f:
+                f.write(report)
 
         return (p, lnprob)
 
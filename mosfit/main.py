@@ -225,6 +225,16 @@ def main():
               "parameter; it is included as Travis requires new lines to be "
               "produed to detected program output."))
 
+    parser.add_argument(
+        '--profile',
+        dest='profile',
+        default=False,
+        action='store_true',
+        help=("Time every module of the model and report the time spent in "
+              "each, along with the fraction of time spent sampling and "
+              "fracking, once fitting completes. The report is also written "
+              "to the `products` directory."))
+
     args = parser.parse_args()
 
     if (isinstance(args.extrapolate_time, list) and
@@ -328,7 +338,8 @@ def main():
         'post_burn': args.post_burn,
         'smooth_times': args.smooth_times,
         'extrapolate_time': args.extrapolate_time,
-        'suffix': args.suffix
+        'suffix': args.suffix,
+        'profile': args.profile
     }
     Fitter().fit_events(**fitargs)
 
@@ -4,10 +4,15 @@ import logging
 import os
 from collections import OrderedDict
 from math import isnan
+from operator import itemgetter
 
 import numpy as np
 # from bayes_opt import BayesianOptimization
 from mosfit.constants import LOCAL_LIKELIHOOD_FLOOR
+from mosfit.modules.parameters.gaussian import Gaussian
+from mosfit.modules.parameters.parameter import Parameter
+from mosfit.modules.parameters.powerlaw import PowerLaw
+from mosfit.profiler import Profiler
 from mosfit.utils import listify, print_wrapped
 # from scipy.optimize import differential_evolution
 from scipy.optimize import minimize
@@ -19,6 +24,14 @@ class Model:
 
     MODEL_OUTPUT_DIR = 'products'
 
+    # Codes of the prior types of the free parameters. Priors of parameter
+    # classes that override the mapping or the prior are custom, and are
+    # evaluated one object at a time.
+    CUSTOM_PRIOR = -1
+    UNIFORM_PRIOR = 0
+    GAUSSIAN_PRIOR = 1
+    POWERLAW_PRIOR = 2
+
     class outClass(object):
         pass
 
@@ -26,7 +39,8 @@ class Model:
                  parameter_path='parameters.json',
                  model='default',
                  wrap_length=100,
-                 pool=None):
+                 pool=None,
+                 profile=False):
         self._model_name = model
         self._pool = pool
         self._is_master = pool.is_master() if pool else False
@@ -102,12 +116,15 @@ class Model:
                 f.read(), object_pairs_hook=OrderedDict)
         self._log = logging.getLogger()
         self._modules = OrderedDict()
+        self._plans = OrderedDict()
+        self._profiler = None
         self._bands = []
 
         # Load the call tree for the model. Work our way in reverse from the
         # observables, first constructing a tree for each observable and then
         # combining trees.
         root_kinds = ['output', 'objective']
+        self._root_kinds = root_kinds
 
         self._trees = OrderedDict()
         self.construct_trees(self._model, self._trees, kinds=root_kinds)
@@ -139,8 +156,8 @@ class Model:
             unsorted_call_stack[tag] = new_entry
         # print(unsorted_call_stack)
 
-        # Currently just have one call stack for all products, can be wasteful
-        # if only using some products.
+        # The full call stack holds every task; `compile_stacks` later prunes
+        # it into a separate plan for each root kind.
         self._call_stack = OrderedDict()
         for depth in range(self._max_depth_all, -1, -1):
             for task in unsorted_call_stack:
@@ -182,6 +199,36 @@ class Model:
             # if class_name == 'filters':
             #     self._bands = self._modules[task].band_names()
 
+        if profile:
+            self.enable_profiling()
+
+    def enable_profiling(self):
+        """Time every call of each module and of the model's walker drawing,
+        fracking, likelihood, and parameter mapping methods. Free parameters
+        whose values `parameter_values` computes directly are timed under
+        `Model.parameter_values` rather than under their modules.
+        """
+        self._profiler = Profiler()
+        for task in self._modules:
+            module = self._modules[task]
+            module.process = self._profiler.wrap(task, module.process)
+        for method in ['draw_walker', 'frack', 'likelihood',
+                       'parameter_values']:
+            setattr(self, method,
+                    self._profiler.wrap('Model.' + method,
+                                        getattr(self, method)))
+
+    def profiler(self):
+        return self._profiler
+
+    def load_filters(self, bands):
+        """Load the filter curves of a list of (band, instrument, bandset,
+        system) tuples, rather than of every known band.
+        """
+        for task in self._call_stack:
+            if self._call_stack[task].get('class', task) == 'filters':
+                self._modules[task].load_bands(bands)
+
     def determine_free_parameters(self, extra_fixed_parameters):
         self._free_parameters = []
         for task in self._call_stack:
@@ -212,6 +259,121 @@ class Model:
                         requests[req] = self._modules[task].request(req)
                     self._modules[parent].handle_requests(**requests)
 
+        self.compile_parameters()
+        self.compile_stacks()
+
+        free = set(self._free_parameters)
+        for task in self._call_stack:
+            self._modules[task].set_free_inputs([
+                x for x in self._dependencies[task]
+                if x in free or self._dependencies[x] & free
+            ])
+
+    def compile_parameters(self):
+        """Compile the free parameters into arrays of their bounds, log flags,
+        prior type codes and prior hyperparameters, so that parameter vectors
+        (or 2D arrays of walkers) are mapped to values, and their log priors
+        summed, with a few array operations.
+        """
+        modules = [self._modules[x] for x in self._free_parameters]
+        self._par_mins = np.array([x._min_value for x in modules], dtype=float)
+        self._par_maxs = np.array([x._max_value for x in modules], dtype=float)
+        self._par_ranges = np.array(
+            [x._max_value - x._min_value for x in modules], dtype=float)
+        self._par_logs = np.array([bool(x._log) for x in modules], dtype=bool)
+
+        # Parameters whose values are produced by `Parameter.process`.
+        self._par_mapped = np.array([
+            type(x).process is Parameter.process and
+            type(x).value is Parameter.value for x in modules
+        ], dtype=bool)
+
+        codes = []
+        for module in modules:
+            pdf = type(module).lnprior_pdf
+            if type(module).value is not Parameter.value:
+                codes.append(self.CUSTOM_PRIOR)
+            elif pdf is Parameter.lnprior_pdf:
+                codes.append(self.UNIFORM_PRIOR)
+            elif pdf is Gaussian.lnprior_pdf:
+                codes.append(self.GAUSSIAN_PRIOR)
+            elif pdf is PowerLaw.lnprior_pdf:
+                codes.append(self.POWERLAW_PRIOR)
+            else:
+                codes.append(self.CUSTOM_PRIOR)
+        self._prior_codes = np.array(codes, dtype=int)
+
+        gaussians = [x for x, c in zip(modules, codes)
+                     if c == self.GAUSSIAN_PRIOR]
+        self._gaussian_pars = np.flatnonzero(
+            self._prior_codes == self.GAUSSIAN_PRIOR)
+        self._gaussian_mus = np.array([x._mu for x in gaussians], dtype=float)
+        self._gaussian_denoms = np.array(
+            [2. * x._sigma**2 for x in gaussians], dtype=float)
+
+        powerlaws = [x for x, c in zip(modules, codes)
+                     if c == self.POWERLAW_PRIOR]
+        self._powerlaw_pars = np.flatnonzero(
+            self._prior_codes == self.POWERLAW_PRIOR)
+        self._powerlaw_mins = np.array([x._miv for x in powerlaws],
+                                       dtype=float)
+        self._powerlaw_ranges = np.array([x._mav - x._miv for x in powerlaws],
+                                         dtype=float)
+        self._powerlaw_alphas = np.array([x._alpha for x in powerlaws],
+                                         dtype=float)
+
+        self._custom_pars = np.flatnonzero(
+            self._prior_codes == self.CUSTOM_PRIOR)
+
+    def parameter_values(self, x):
+        """Map the fractions `x` of the free parameters (a vector, or a 2D
+        array of walkers) to their values, as `Parameter.value` does.
+        """
+        values = np.clip(
+            np.asarray(x, dtype=float) * self._par_ranges + self._par_mins,
+            self._par_mins, self._par_maxs)
+        values[..., self._par_logs] = np.exp(values[..., self._par_logs])
+        return values
+
+    def compile_stacks(self):
+        """Compile the call stack into a flat execution plan for each root.
+        Each plan only contains the root's own tasks and the tasks they
+        depend upon, tasks that only feed other roots are dropped. Each step
+        of a plan runs one module, feeding it only the outputs of the modules
+        it (transitively) depends upon plus its free parameter fraction, if
+        any. The keys each module produces are bound into slots of a flat
+        context list on the first run of each plan.
+        """
+        self._dependencies = OrderedDict()
+        for task in self._call_stack:
+            self._dependencies[task] = self.get_dependencies(task)
+
+        self._plans = OrderedDict()
+        for root in self._root_kinds:
+            members = set()
+            for task in self._call_stack:
+                if self._call_stack[task]['kind'] == root:
+                    members.add(task)
+                    members.update(self._dependencies[task])
+            tasks = [x for x in self._call_stack if x in members]
+            self._plans[root] = {
+                'tasks': tasks,
+                'steps': None,
+                'shares': OrderedDict()
+            }
+
+    def get_dependencies(self, task, deps=None):
+        """Return the set of tasks a given task transitively depends upon,
+        including roots of other kinds that it takes as inputs.
+        """
+        if deps is None:
+            deps = set()
+        for inp in listify(self._call_stack[task].get('inputs', [])):
+            if inp in self._call_stack and inp not in deps:
+                deps.add(inp)
+                self.get_dependencies(inp, deps)
+        return deps
+
     def frack(self, arg):
         """Perform fracking upon a single walker, using a local minimization
         method.
@@ -334,19 +496,48 @@ class Model:
         return max_depth
 
     def likelihood(self, x):
-        """Return score related to maximum likelihood.
+        """Return score related to maximum likelihood. If `x` is a 2D array of
+        walkers, an array with one score per walker is returned.
         """
-        outputs = self.run_stack(x, root='objective')
+        batch = np.ndim(x) == 2
+        if self._profiler:
+            self._profiler.tally(len(x) if batch else 1)
+        if batch:
+            outputs = self.run_batch(x, root='objective')
+        else:
+            outputs = self.run_stack(x, root='objective')
         return outputs['value']
 
     def prior(self, x):
-        """Return score related to paramater priors.
+        """Return score related to paramater priors. If `x` is a 2D array of
+        walkers, an array with one score per walker is returned.
         """
-        prior = 0.0
-        for pi, par in enumerate(self._free_parameters):
-            lprior = self._modules[par].lnprior_pdf(x[pi])
-            prior = prior + lprior
-        return prior
+        x = np.asarray(x, dtype=float)
+        values = self.parameter_values(x)
+        # The priors are summed in order after a leading zero, as a running
+        # sum would.
+        lpriors = np.zeros(x.shape[:-1] + (self._num_free_parameters + 1, ))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pars = self._gaussian_pars
+            if len(pars):
+                gvalues = values[..., pars]
+                logs = self._par_logs[pars]
+                gvalues[..., logs] = np.log(gvalues[..., logs])
+                lpriors[..., pars + 1] = -np.float_power(
+                    gvalues - self._gaussian_mus, 2.0) / self._gaussian_denoms
+            pars = self._powerlaw_pars
+            if len(pars):
+                lpriors[..., pars + 1] = np.log(
+                    np.float_power((values[..., pars] - self._powerlaw_mins) /
+                                   self._powerlaw_ranges,
+                                   self._powerlaw_alphas))
+        for pi in self._custom_pars:
+            module = self._modules[self._free_parameters[pi]]
+            if x.ndim == 2:
+                lpriors[:, pi + 1] = [module.lnprior_pdf(y) for y in x[:, pi]]
+            else:
+                lpriors[pi + 1] = module.lnprior_pdf(x[pi])
+        return np.cumsum(lpriors, axis=-1)[..., -1]
 
     def boprob(self, **kwargs):
         x = []
@@ -368,26 +559,274 @@ class Model:
 
     def run_stack(self, x, root='objective'):
         """Run a stack of modules as defined in the model definition file. Only
-        run functions that match the specified root.
+        run functions that match the specified root. Modules that do not
+        depend upon any of the free parameters that changed since the last
+        call are skipped, their previous outputs are reused. Modules shared
+        with the stacks of other roots are copied from those stacks when they
+        were last run with the same values of the free parameters.
         """
-        inputs = OrderedDict()
-        outputs = OrderedDict()
-        pos = 0
-        cur_depth = self._max_depth_all
-        for task in self._call_stack:
-            cur_task = self._call_stack[task]
-            if root not in cur_task['roots']:
+        if root not in self._plans:
+            self.compile_stacks()
+        plan = self._plans[root]
+        if plan['steps'] is None:
+            return self.bind_stack(x, root)
+
+        changed = self.changed_mask(plan, x)
+        if changed:
+            # Until every step has run, the context matches no parameters,
+            # so that a module raising leaves everything to be rerun.
+            plan['last'] = np.full(len(plan['last']), np.nan)
+
+        donors = []
+        if changed:
+            for other in self._plans:
+                oplan = self._plans[other]
+                if other == root or oplan['steps'] is None:
+                    continue
+                if other not in plan['shares']:
+                    plan['shares'][other] = self.get_shares(plan, oplan)
+                donors.append((self.changed_mask(oplan, x), oplan['context'],
+                               plan['shares'][other]))
+
+        ctx = plan['context']
+        ctx[1] = x
+        par_values = self.parameter_values(x) if changed else None
+        hits, misses = plan['hits'], plan['misses']
+        for si, (module, pos, mask, keys, getter, writes) in enumerate(
+                plan['steps']):
+            if not mask & changed:
+                hits[si] += 1
+                continue
+            shared = False
+            for dchanged, dctx, shares in donors:
+                if shares[si] is not None and not mask & dchanged:
+                    for slot, dslot in shares[si]:
+                        ctx[slot] = dctx[dslot]
+                    shared = True
+                    break
+            if shared:
+                hits[si] += 1
+                continue
+            misses[si] += 1
+            if pos >= 0 and writes and self._par_mapped[pos]:
+                ctx[writes[0][1]] = par_values[pos]
                 continue
-            if cur_task['depth'] != cur_depth:
-                inputs = outputs
-            inputs.update({'root': root})
-            cur_depth = cur_task['depth']
-            if task in self._free_parameters:
-                inputs.update({'fraction': x[pos]})
-                inputs.setdefault('fractions', []).append(x[pos])
-                pos = pos + 1
+            inputs = dict(zip(keys, getter(ctx)))
+            if pos >= 0:
+                inputs['fraction'] = x[pos]
+            new_outs = module.process(**inputs)
+            for key, slot in writes:
+                ctx[slot] = new_outs[key]
+        if changed:
+            plan['last'] = np.array(x, dtype=float)
+
+        return OrderedDict(zip(plan['keys'], plan['getter'](ctx)))
+
+    def changed_mask(self, plan, x):
+        """Return a bit mask of the free parameters that differ between `x`
+        and the last parameters a plan was run with.
+        """
+        changed = 0
+        for pi in np.flatnonzero(np.asarray(x, dtype=float) != plan['last']):
+            changed |= 1 << int(pi)
+        return changed
+
+    def get_shares(self, plan, donor):
+        """Map the output slots of each step in a plan to the slots of the
+        same task in a donor plan, if the task can be shared between them.
+        Tasks that depend on a root-specific module cannot be shared.
+        """
+        shares = []
+        for task, step in zip(plan['tasks'], plan['steps']):
+            if task not in donor['writes'] or any(
+                    self._modules[x].is_root_specific()
+                    for x in self._dependencies[task] | set([task])):
+                shares.append(None)
+                continue
+            dslots = OrderedDict(donor['writes'][task])
+            shares.append([(slot, dslots[key]) for key, slot in step[-1]])
+        return shares
+
+    def bind_stack(self, x, root='objective'):
+        """Run a compiled plan for the first time, assigning a context slot to
+        every key each module outputs and resolving the slots each module
+        reads from.
+        """
+        plan = self._plans[root]
+        ctx = [root, x]
+        results = OrderedDict([('root', 0), ('fractions', 1)])
+        writes = OrderedDict()
+        steps = []
+        in_slots = []
+        for task in plan['tasks']:
+            slots = OrderedDict([('root', 0), ('fractions', 1)])
+            for dep in writes:
+                if dep in self._dependencies[task]:
+                    slots.update(writes[dep])
+            in_keys = list(slots.keys())
+            in_slots.append(list(slots.values()))
+            getter = itemgetter(*in_slots[-1])
+            pos = (self._free_parameters.index(task)
+                   if task in self._free_parameters else -1)
+
+            # Bit mask of the free parameters this task depends upon. The
+            # root task receives the full parameter vector and always runs.
+            mask = 0
+            if self._call_stack[task]['kind'] == root:
+                mask = (1 << self._num_free_parameters) - 1
+            for dep in self._dependencies[task] | set([task]):
+                if dep in self._free_parameters:
+                    mask |= 1 << self._free_parameters.index(dep)
+
+            inputs = dict(zip(in_keys, getter(ctx)))
+            if pos >= 0:
+                inputs['fraction'] = x[pos]
             new_outs = self._modules[task].process(**inputs)
-            outputs.update(new_outs)
 
-            if cur_task['kind'] == root:
-                return outputs
+            writes[task] = OrderedDict()
+            for key in new_outs:
+                writes[task][key] = len(ctx)
+                results[key] = len(ctx)
+                ctx.append(new_outs[key])
+            steps.append((self._modules[task], pos, mask, in_keys, getter,
+                          list(writes[task].items())))
+
+        plan['context'] = ctx
+        plan['steps'] = steps
+        plan['writes'] = writes
+        plan['keys'] = list(results.keys())
+        plan['slots'] = list(results.values())
+        plan['getter'] = itemgetter(*plan['slots'])
+        plan['last'] = np.array(x, dtype=float)
+
+        plan['in_slots'] = in_slots
+        plan['hits'] = [0 for s in steps]
+        plan['misses'] = [1 for s in steps]
+
+        return OrderedDict(zip(plan['keys'], plan['getter'](ctx)))
+
+    def run_batch(self, xs, root='objective'):
+        """Run a stack for a 2D array of walkers at once, returning arrays
+        with a leading walker axis for the outputs that differ between
+        walkers.
+        """
+        plan, ctx, walker_slots = self.batch_context(xs, root)
+        return OrderedDict(zip(plan['keys'], plan['getter'](ctx)))
+
+    def run_walkers(self, xs, root='output'):
+        """Run a stack for a 2D array of walkers at once, returning the
+        outputs of each walker separately, as `run_stack` would.
+        """
+        plan, ctx, walker_slots = self.batch_context(xs, root)
+        return [
+            OrderedDict([(key, ctx[slot][wi] if slot in walker_slots else
+                          ctx[slot])
+                         for key, slot in zip(plan['keys'], plan['slots'])])
+            for wi in range(len(xs))
+        ]
+
+    def batch_context(self, xs, root='objective'):
+        """Run a stack for a 2D array of walkers at once, returning its plan,
+        the resulting context and the set of context slots that hold one
+        value per walker. Inputs that vary between walkers are given a leading
+        walker axis; modules that are not batchable, or that are given inputs
+        that could not be stacked, are called once per walker instead, with
+        their outputs stacked back together. Modules that do not depend on the
+        free parameters are not rerun, and modules none of whose inputs differ
+        between walkers are run once. Hits and misses are counted per walker.
+        """
+        xs = np.asarray(xs, dtype=float)
+        if root not in self._plans or self._plans[root]['steps'] is None:
+            self.run_stack(xs[0], root)
+        plan = self._plans[root]
+
+        ctx = list(plan['context'])
+        ctx[1] = xs
+        # Slots holding one value per walker, the others hold values that
+        # are the same for all walkers.
+        walker_slots = set([1])
+        par_values = np.ascontiguousarray(self.parameter_values(xs).T)
+        hits, misses = plan['hits'], plan['misses']
+        for si, (step, slots) in enumerate(
+                zip(plan['steps'], plan['in_slots'])):
+            module, pos, mask, keys, getter, writes = step
+            if not mask:
+                hits[si] += len(xs)
+                continue
+            if pos >= 0 and writes and self._par_mapped[pos]:
+                misses[si] += len(xs)
+                ctx[writes[0][1]] = par_values[pos]
+                walker_slots.add(writes[0][1])
+                continue
+            values = getter(ctx)
+            flags = [x in walker_slots for x in slots]
+            if pos < 0 and not any(flags):
+                # No input differs between walkers, one call serves them all.
+                hits[si] += len(xs) - 1
+                misses[si] += 1
+                new_outs = module.process(**dict(zip(keys, values)))
+                for key, slot in writes:
+                    ctx[slot] = new_outs[key]
+                    walker_slots.discard(slot)
+                continue
+            misses[si] += len(xs)
+            if module.is_batchable() and all(
+                    isinstance(v, np.ndarray)
+                    for v, f in zip(values, flags) if f):
+                inputs = dict(zip(keys, values))
+                if pos >= 0:
+                    inputs['fraction'] = xs[:, pos]
+                new_outs = module.process(**inputs)
+                # Array outputs of a batch have a leading walker axis, others
+                # are the same for all walkers.
+                for key, slot in writes:
+                    ctx[slot] = new_outs[key]
+                    if isinstance(ctx[slot], np.ndarray):
+                        walker_slots.add(slot)
+                    else:
+                        walker_slots.discard(slot)
+                continue
+            rows = []
+            for wi in range(len(xs)):
+                inputs = dict([(k, v[wi] if f else v)
+                               for k, v, f in zip(keys, values, flags)])
+                if pos >= 0:
+                    inputs['fraction'] = xs[wi, pos]
+                rows.append(module.process(**inputs))
+            for key, slot in writes:
+                outs = [r[key] for r in rows]
+                # The same object returned for every walker is shared.
+                if all(x is outs[0] for x in outs):
+                    ctx[slot] = outs[0]
+                    walker_slots.discard(slot)
+                else:
+                    ctx[slot] = self.stack_rows(outs)
+                    walker_slots.add(slot)
+
+        return plan, ctx, walker_slots
+
+    def stack_rows(self, rows):
+        """Stack per-walker outputs into an array with a leading walker axis.
+        Outputs that are not numpy arrays or numbers, or that cannot be
+        stacked (ragged rows), are left as a list with one entry per walker.
+        """
+        if not all(isinstance(r, (np.ndarray, float, int)) for r in rows):
+            return rows
+        try:
+            stacked = np.array(rows)
+        except ValueError:
+            return rows
+        if stacked.dtype == object:
+            return rows
+        return stacked
+
+    def cache_stats(self, root='objective'):
+        """Return the number of times each module of a stack was skipped
+        (hits) or run (misses) because of changes in the free parameters.
+        """
+        plan = self._plans.get(root, {})
+        if not plan.get('steps'):
+            return OrderedDict()
+        return OrderedDict([(task, {'hits': h, 'misses': m})
+                            for task, h, m in zip(
+                                plan['tasks'], plan['hits'], plan['misses'])])
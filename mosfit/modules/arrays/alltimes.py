@@ -1,3 +1,6 @@
+from collections import OrderedDict
+
+import numpy as np
 from mosfit.modules.module import Module
 
 CLASS_NAME = 'AllTimes'
@@ -8,34 +11,40 @@ class AllTimes(Module):
     also include interpolations/extrapolations.
     """
 
+    COLUMNS = ['times', 'systems', 'instruments', 'bandsets', 'bands']
+
+    # Number of sets of observation lists whose outputs are kept, only a few
+    # (one per root) are in use at a time.
+    CACHE_SIZE = 4
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._root_specific = True
+        self._cache = OrderedDict()
 
     def process(self, **kwargs):
-        if (kwargs.get('root', 'output') == 'output' and
-                'extra_times' in kwargs):
-            obslist = (
-                list(
-                    zip(*(kwargs['times'], kwargs['systems'], kwargs[
-                        'instruments'], kwargs['bandsets'], kwargs['bands'],
-                          [True for x in range(len(kwargs['times']))]))) +
-                list(
-                    zip(*(kwargs['extra_times'], kwargs[
-                        'extra_systems'], kwargs['extra_instruments'], kwargs[
-                            'extra_bandsets'], kwargs['extra_bands'],
-                          [False for x in range(len(kwargs['extra_times']))])))
-            )
-            obslist.sort()
-
-            (self._times, self._systems, self._instruments, self._bandsets,
-             self._bands, self._observed) = zip(*obslist)
-        else:
-            self._times = kwargs['times']
-            self._systems = kwargs['systems']
-            self._instruments = kwargs['instruments']
-            self._bandsets = kwargs['bandsets']
-            self._bands = kwargs['bands']
-            self._observed = [True for x in kwargs['times']]
+        # Outputs only differ between roots if there are extra times.
+        self._root_specific = 'extra_times' in kwargs
+        extra = (kwargs.get('root', 'output') == 'output' and
+                 'extra_times' in kwargs)
+        columns = [kwargs[x] for x in self.COLUMNS]
+        if extra:
+            columns += [kwargs['extra_' + x] for x in self.COLUMNS]
+
+        # Outputs only depend upon the data, they are computed once for each
+        # set of observation lists. Only the most recently used sets are kept.
+        key = tuple(id(x) for x in columns)
+        cached = self._cache.get(key)
+        if cached is None or not all(
+                x is y for x, y in zip(cached[0], columns)):
+            # Keep references to the lists so their ids are not reused.
+            cached = (columns, self.merge_columns(columns, extra))
+            self._cache[key] = cached
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        (self._times, self._systems, self._instruments, self._bandsets,
+         self._bands, self._observed) = cached[1]
 
         outputs = {}
         outputs['all_times'] = self._times
@@ -44,3 +53,32 @@ class AllTimes(Module):
         outputs['all_bands'] = self._bands
         outputs['observed'] = self._observed
         return outputs
+
+    def merge_columns(self, columns, extra):
+        """Return read-only arrays of the observation columns, with the extra
+        observations merged in time order if `extra` is set. The sort
+        permutation is kept in `self._order`.
+        """
+        n_cols = len(self.COLUMNS)
+        arrays = [
+            np.asarray(x, dtype=float) if name == 'times' else np.asarray(x)
+            for name, x in zip(self.COLUMNS, columns)
+        ]
+        observed = np.ones(len(arrays[0]), dtype=bool)
+        if extra:
+            arrays = [
+                np.concatenate((x, y))
+                for x, y in zip(arrays, columns[n_cols:])
+            ]
+            observed = np.concatenate(
+                (observed, np.zeros(len(columns[n_cols]), dtype=bool)))
+            # Sorted by time, then by the other columns, actual observations
+            # after the extra ones.
+            self._order = np.lexsort([observed] + arrays[::-1])
+        else:
+            self._order = np.arange(len(observed))
+
+        arrays = [x[self._order] for x in arrays + [observed]]
+        for x in arrays:
+            x.setflags(write=False)
+        return arrays
@@ -16,23 +16,91 @@ class DenseTimes(Module):
         super().__init__(**kwargs)
         self._n_times = kwargs[
             'n_times'] if 'n_times' in kwargs else self.N_TIMES
+        # Steps of the log-spaced grid, only its end point varies.
+        self._steps = np.arange(self._n_times, dtype=float)
+        self._order = None
+        self._batchable = True
 
     def process(self, **kwargs):
         self._rest_times = kwargs['rest_times']
         self._t_explosion = kwargs['texplosion']
+        rest_times = np.asarray(self._rest_times, dtype=float)
+        if np.ndim(self._t_explosion):
+            return self.walker_times(rest_times,
+                                     np.asarray(self._t_explosion))
 
         outputs = {}
-        max_times = max(self._rest_times)
+        max_times = np.max(rest_times)
         if max_times > self._t_explosion:
-            outputs['dense_times'] = list(
-                sorted(
-                    set([0.0] + [
-                        x + self._t_explosion
-                        for x in np.logspace(
-                            self.L_T_MIN,
-                            np.log10(max_times - self._t_explosion),
-                            num=self._n_times)
-                    ] + self._rest_times)))
+            grid = self.log_grid(max_times - self._t_explosion) + (
+                self._t_explosion)
+            fixed = self.sorted_times(rest_times)
+            fixed = np.insert(fixed, np.searchsorted(fixed, 0.0), 0.0)
+            dense_times = np.insert(grid, np.searchsorted(grid, fixed), fixed)
+            dense_times = dense_times[np.concatenate(
+                ([True], dense_times[1:] != dense_times[:-1]))]
+            outputs['dense_times'] = dense_times
+            outputs['dense_indices'] = np.searchsorted(dense_times,
+                                                       rest_times)
         else:
             outputs['dense_times'] = self._rest_times
+            outputs['dense_indices'] = np.arange(len(rest_times))
         return outputs
+
+    def walker_times(self, rest_times, t_explosion):
+        """Return the dense times of a batch of walkers with explosion times
+        `t_explosion`, which all have the same length. Times are not
+        deduplicated, and walkers exploding after the last observation get
+        their grid at the last observation instead.
+        """
+        rest_times = np.broadcast_to(
+            rest_times, t_explosion.shape + rest_times.shape[-1:])
+        max_times = np.max(rest_times, axis=-1)
+        after = max_times > t_explosion
+        grid = self.log_grid(np.where(
+            after, max_times - t_explosion, 1.0)[:, None]) + t_explosion[:,
+                                                                        None]
+        grid[~after] = max_times[~after, None]
+
+        # Observed times come first, so that the indices of the observations
+        # point at the first of any equal times.
+        fixed = self.sorted_times(rest_times)
+        merged = np.concatenate(
+            (fixed, np.zeros((len(fixed), 1)), grid), axis=-1)
+        order = np.argsort(merged, axis=-1, kind='stable')
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order,
+                          np.arange(order.shape[-1])[None, :], axis=-1)
+        dense_indices = np.empty(rest_times.shape, dtype=int)
+        dense_indices[:, self._order] = positions[:, :rest_times.shape[-1]]
+        return {
+            'dense_times': np.take_along_axis(merged, order, axis=-1),
+            'dense_indices': dense_indices
+        }
+
+    def log_grid(self, span):
+        """Return `n_times` times log-spaced from 10**L_T_MIN to `span`, equal
+        to those of `np.logspace`. For an array of spans with a trailing
+        axis, one grid is returned per span.
+        """
+        stop = np.log10(span)
+        exps = self._steps * ((stop - self.L_T_MIN) /
+                              max(self._n_times - 1, 1)) + self.L_T_MIN
+        exps[..., -1] = stop[..., 0] if np.ndim(stop) else stop
+        return 10.0**exps
+
+    def sorted_times(self, times):
+        """Return `times` sorted along their last axis. The sort order only
+        depends on the observed times and is reused while it still holds,
+        walkers share the order of the first.
+        """
+        if self._order is not None and len(self._order) == times.shape[-1]:
+            sorted_times = times[..., self._order]
+            if np.all(sorted_times[..., 1:] >= sorted_times[..., :-1]):
+                return sorted_times
+        self._order = np.argsort(times.reshape(-1, times.shape[-1])[0],
+                                 kind='stable')
+        sorted_times = times[..., self._order]
+        if not np.all(sorted_times[..., 1:] >= sorted_times[..., :-1]):
+            raise ValueError('Walkers differ in the order of their times.')
+        return sorted_times
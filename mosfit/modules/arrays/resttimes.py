@@ -1,3 +1,4 @@
+import numpy as np
 from mosfit.modules.module import Module
 
 CLASS_NAME = 'RestTimes'
@@ -9,15 +10,20 @@ class RestTimes(Module):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._batchable = True
 
     def process(self, **kwargs):
         self._times = kwargs['all_times']
-        self._t_explosion = kwargs['texplosion']
+        self._t_explosion = np.asarray(kwargs['texplosion'], dtype=float)
+        zp1 = 1.0 + np.asarray(kwargs['redshift'], dtype=float)
 
         outputs = {}
-        outputs['rest_times'] = [
-            x / (1.0 + kwargs['redshift']) for x in self._times
-        ]
-        outputs['resttexplosion'] = self._t_explosion / (
-            1.0 + kwargs['redshift'])
+        rest_times = np.asarray(self._times, dtype=float) / self.per_time(zp1)
+        # In a batch of walkers, every walker gets rest times of its own.
+        shape = np.broadcast(self._t_explosion, zp1).shape
+        if shape:
+            rest_times = np.broadcast_to(rest_times,
+                                         shape + rest_times.shape[-1:])
+        outputs['rest_times'] = rest_times
+        outputs['resttexplosion'] = self._t_explosion / zp1
         return outputs
@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import numpy as np
 from mosfit.modules.module import Module
 from mosfit.utils import is_number, listify
@@ -13,6 +15,8 @@ class Transient(Module):
         super().__init__(**kwargs)
         self._keys = kwargs.get('keys', '')
         self._data_determined_parameters = []
+        self._num_keys = set()
+        self._boo_keys = set()
 
     def process(self, **kwargs):
         return self._data
@@ -51,6 +55,8 @@ class Transient(Module):
             exc_subkeys = [
                 x for x in subkeys if 'exclude' in listify(subkeys[x])
             ]
+            self._num_keys.update(x + 's' for x in num_subkeys)
+            self._boo_keys.update(x + 's' for x in boo_subkeys)
             # Only include data that contains all subkeys
             for entry in subdata:
                 if any([x not in entry for x in req_subkeys]):
@@ -108,10 +114,7 @@ class Transient(Module):
                               if len(band_instruments) else [''], band_bandsets
                               if len(band_bandsets) else [''], band_list))))
 
-            uniqueobs = []
-            for o in obs:
-                if o not in uniqueobs:
-                    uniqueobs.append(o)
+            uniqueobs = list(OrderedDict.fromkeys(obs))
 
             minet, maxet = (tuple(extrapolate_time)
                             if len(extrapolate_time) == 2 else
@@ -122,17 +125,15 @@ class Transient(Module):
                 sorted(
                     set([x for x in self._data['times']] + list(
                         np.linspace(mint, maxt, max(smooth_times, 2))))))
-            currobslist = list(
+            currobs = set(
                 zip(*(self._data['times'], self._data['systems'], self._data[
                     'instruments'], self._data['bandsets'], self._data['bands']
                       )))
 
-            obslist = []
-            for t in alltimes:
-                for o in uniqueobs:
-                    newobs = (t, o[0], o[1], o[2], o[3])
-                    if newobs not in obslist and newobs not in currobslist:
-                        obslist.append(newobs)
+            # Times and observation types are unique, so every combination is
+            # new unless it is an actual observation.
+            obslist = [(t, ) + o for t in alltimes for o in uniqueobs
+                       if (t, ) + o not in currobs]
 
             obslist.sort()
 
@@ -149,5 +150,55 @@ class Transient(Module):
                     x - minv for x in self._data['extra_' + qkey]
                 ]
 
+        self.set_columns()
+
+    def set_columns(self):
+        """Store the data lists as columns. Numeric values become float
+        arrays with NaN where missing, flags become boolean arrays, and all
+        other values become string arrays.
+        """
+        for key in list(self._data):
+            values = self._data[key]
+            if not isinstance(values, (list, tuple)):
+                continue
+            base = key[len('extra_'):] if key.startswith('extra_') else key
+            if base in self._num_keys:
+                self._data[key] = np.array(
+                    [float(x) if is_number(x) else np.nan for x in values])
+            elif base in self._boo_keys:
+                self._data[key] = np.array(
+                    [bool(x) for x in values], dtype=bool)
+            else:
+                self._data[key] = np.array(values, dtype=str)
+        for values in self._data.values():
+            if isinstance(values, np.ndarray):
+                values.setflags(write=False)
+
+    def blank_missing(self, output):
+        """Replace the NaN of missing values in the numeric data columns of
+        `output` by `''`, as they are written in the input data.
+        """
+        for key in output:
+            base = key[len('extra_'):] if key.startswith('extra_') else key
+            if base in self._num_keys and isinstance(output[key], np.ndarray):
+                output[key] = [
+                    '' if np.isnan(x) else x for x in output[key].tolist()
+                ]
+        return output
+
+    def get_observed_bands(self):
+        """Return (band, instrument, bandset, system) tuples of all
+        observations, including those added for smoothing.
+        """
+        keys = ['bands', 'instruments', 'bandsets', 'systems']
+        bands = []
+        for prefix in ['', 'extra_']:
+            if prefix + 'bands' not in self._data:
+                continue
+            nobs = len(self._data[prefix + 'bands'])
+            bands.extend(
+                zip(*[self._data.get(prefix + x, [''] * nobs) for x in keys]))
+        return bands
+
     def get_data_determined_parameters(self):
         return self._data_determined_parameters
@@ -1,8 +1,5 @@
-from math import isnan
-
 import numpy as np
 from mosfit.modules.engines.engine import Engine
-from scipy import interpolate
 
 CLASS_NAME = 'CSM'
 
@@ -15,10 +12,25 @@ class CSM(Engine):
 
     """
 
+    # Bf, Br, and A of the self-similar solutions as functions of n, for
+    # s = 0 and s = 2.
+    NS = [6, 7, 8, 9, 10, 12, 14]
+    COEFFS = {
+        0: [[1.256, 1.181, 1.154, 1.140, 1.131, 1.121, 1.116],
+            [0.906, 0.935, 0.950, 0.960, 0.966, 0.974, 0.979],
+            [2.4, 1.2, 0.71, 0.47, 0.33, 0.19, 0.12]],
+        2: [[1.377, 1.299, 1.267, 1.250, 1.239, 1.226, 1.218],
+            [0.958, 0.970, 0.976, 0.981, 0.984, 0.987, 0.990],
+            [0.62, 0.27, 0.15, 0.096, 0.067, 0.038, 0.025]]
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._ns = np.array(self.NS, dtype=float)
+        self._coeffs = dict([(k, np.array(v))
+                             for k, v in self.COEFFS.items()])
 
-    def process(self, **kwargs):
+    def compute_luminosities(self, ts, **kwargs):
         self._s = kwargs['s']
         self._delta = kwargs['delta']  # [0,3)
         self._n = kwargs['n']  # [6,10]
@@ -29,12 +41,6 @@ class CSM(Engine):
         self._rho = kwargs['rho']
         self._vph = kwargs['vejecta'] * 1.e5
         self._Esn = 3. * self._vph**2 * self._mejecta / 10.
-        self._rest_t_explosion = kwargs['resttexplosion']
-
-        if 'dense_times' in kwargs:
-            self._times = kwargs['dense_times']
-        else:
-            self._times = kwargs['rest_times']
 
         self._g_n = (1.0 / (4.0 * np.pi * (self._n - self._delta)) * (
             2.0 * (5.0 - self._delta) * (self._n - 5.0) * self._Esn)**(
@@ -45,25 +51,14 @@ class CSM(Engine):
 
         self._ti = self._R0 / self._vph
 
-        if self._s == 0:
-            ns = [6, 7, 8, 9, 10, 12, 14]
-            Bfs = [1.256, 1.181, 1.154, 1.140, 1.131, 1.121, 1.116]
-            Brs = [0.906, 0.935, 0.950, 0.960, 0.966, 0.974, 0.979]
-            As = [2.4, 1.2, 0.71, 0.47, 0.33, 0.19, 0.12]
-
-        else:  # s == 2
-            ns = [6, 7, 8, 9, 10, 12, 14]
-            Bfs = [1.377, 1.299, 1.267, 1.250, 1.239, 1.226, 1.218]
-            Brs = [0.958, 0.970, 0.976, 0.981, 0.984, 0.987, 0.990]
-            As = [0.62, 0.27, 0.15, 0.096, 0.067, 0.038, 0.025]
-
-        Bf_func = interpolate.interp1d(ns, Bfs)
-        Br_func = interpolate.interp1d(ns, Brs)
-        A_func = interpolate.interp1d(ns, As)
-
-        self._Bf = Bf_func(self._n)
-        self._Br = Br_func(self._n)
-        self._A = A_func(self._n)
+        # Linear interpolation of the coefficients in n.
+        coeffs = self._coeffs[0 if self._s == 0 else 2]
+        ni = int(np.clip(
+            np.searchsorted(self._ns, self._n, side='right') - 1, 0,
+            len(self._ns) - 2))
+        frac = (self._n - self._ns[ni]) / (self._ns[ni + 1] - self._ns[ni])
+        self._Bf, self._Br, self._A = (
+            coeffs[:, ni] + frac * (coeffs[:, ni + 1] - coeffs[:, ni]))
 
         # scaling constant for CSM density profile
         self._q = self._rho * self._R0**self._s
@@ -103,43 +98,17 @@ class CSM(Engine):
             self._s - 3.0
         ))  # time at which reverse shock sweeps up all ejecta - reverse shock power input then terminates
 
-        ts = [
-            np.inf
-            if self._rest_t_explosion > x else (x - self._rest_t_explosion)
-            for x in self._times
-        ]
-
-        luminosities = [
-            2.0 * np.pi / (self._n - self._s)**3 * self._g_n**(
-                (5.0 - self._s) / (self._n - self._s)) * self._q**(
-                    (self._n - 5.0) /
-                    (self._n - self._s)) * (self._n - 3.0)**2 *
-            (self._n - 5.0) * self._Bf**(5.0 - self._s) * self._A**(
-                (5.0 - self._s) /
-                (self._n - self._s)) * (t * 86400. + self._ti)**(
-                    (2.0 * self._n + 6.0 * self._s - self._n * self._s - 15.) /
-                    (self._n - self._s)) * (
-                        (self._t_FS - t * 86400.) > 0) + 2.0 * np.pi *
-            (self._A * self._g_n / self._q)**(
-                (5.0 - self._n) /
-                (self._n - self._s)) * self._Br**(5.0 - self._n) * self._g_n *
-            ((3.0 - self._s) /
-             (self._n - self._s))**3 * (t * 86400. + self._ti)**(
-                 (2.0 * self._n + 6.0 * self._s - self._n * self._s - 15.0) /
-                 (self._n - self._s)) * ((self._t_RS - t * 86400.) > 0)
-            for t in ts
-        ]
-
-        luminosities = [0.0 if isnan(x) else x for x in luminosities]
-
-        old_luminosities = kwargs.get('luminosities', None)
-
-        if old_luminosities is not None:
-            luminosities = [
-                x + y for x, y in zip(old_luminosities, luminosities)
-            ]
-
-        # Add on to any existing luminosity
-        luminosities = self.add_to_existing_lums(luminosities)
-
-        return {'luminosities': luminosities}
+        n, s = self._n, self._s
+        # Parameter-only factors of the forward and reverse shock terms.
+        fs_coeff = (2.0 * np.pi / (n - s)**3 * self._g_n**(
+            (5.0 - s) / (n - s)) * self._q**((n - 5.0) / (n - s)) *
+                    (n - 3.0)**2 * (n - 5.0) * self._Bf**(5.0 - s) *
+                    self._A**((5.0 - s) / (n - s)))
+        rs_coeff = (2.0 * np.pi * (self._A * self._g_n / self._q)**(
+            (5.0 - n) / (n - s)) * self._Br**(5.0 - n) * self._g_n *
+                    ((3.0 - s) / (n - s))**3)
+        exponent = (2.0 * n + 6.0 * s - n * s - 15.) / (n - s)
+
+        tsec = ts * 86400.
+        return (fs_coeff * (self._t_FS - tsec > 0) + rs_coeff *
+                (self._t_RS - tsec > 0)) * (tsec + self._ti)**exponent
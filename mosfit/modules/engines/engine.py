@@ -1,3 +1,4 @@
+import numpy as np
 from mosfit.modules.module import Module
 
 CLASS_NAME = 'Engine'
@@ -5,17 +6,65 @@ CLASS_NAME = 'Engine'
 
 class Engine(Module):
     """Generic engine module.
+
+    Engines compute luminosities as numpy arrays over the dense times (or
+    the observed times), adding onto the luminosities of any engine that
+    precedes them. Subclasses implement `compute_luminosities`.
     """
 
+    # Times since explosion shared by all engines, the last times and
+    # explosion time they were computed for are kept alongside.
+    _shared_times = (None, None, None)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
     def process(self, **kwargs):
-        return {}
+        if 'dense_times' in kwargs:
+            self._times = kwargs['dense_times']
+        else:
+            self._times = kwargs['rest_times']
+        self._rest_t_explosion = kwargs['resttexplosion']
+
+        ts = self.times_since_explosion(self._times, self._rest_t_explosion)
+        with np.errstate(invalid='ignore', over='ignore'):
+            luminosities = np.array(
+                self.compute_luminosities(ts, **kwargs), dtype=float)
+        luminosities[np.isnan(luminosities)] = 0.0
 
-    def add_to_existing_lums(self, new_lums, **kwargs):
         # Add on to any existing luminosity
+        luminosities = self.add_to_existing_lums(luminosities, **kwargs)
+
+        return {'luminosities': luminosities}
+
+    def compute_luminosities(self, ts, **kwargs):
+        """Return the luminosities at times since explosion `ts` (in days,
+        `np.inf` before the explosion). NaNs are replaced by zeros.
+        """
+        return np.zeros_like(ts)
+
+    def times_since_explosion(self, times, t_explosion):
+        """Return the times since explosion as a read-only array, with times
+        before the explosion set to `np.inf`. The array is shared between
+        engines evaluated for the same times.
+        """
+        cached_times, cached_t_explosion, ts = Engine._shared_times
+        if times is cached_times and np.array_equal(t_explosion,
+                                                    cached_t_explosion):
+            return ts
+        times_arr = np.asarray(times, dtype=float)
+        t_exp = self.per_time(t_explosion)
+        ts = np.where(times_arr >= t_exp, times_arr - t_exp, np.inf)
+        ts.setflags(write=False)
+        Engine._shared_times = (times, t_explosion, ts)
+        return ts
+
+    def add_to_existing_lums(self, new_lums, **kwargs):
+        """Add the luminosities of any preceding engine onto `new_lums`,
+        accumulating in place when `new_lums` is an array of this engine.
+        """
+        new_lums = np.asarray(new_lums, dtype=float)
         old_lums = kwargs.get('luminosities', None)
         if old_lums is not None:
-            new_lums = [x + y for x, y in zip(old_lums, new_lums)]
+            new_lums += np.asarray(old_lums, dtype=float)
         return new_lums
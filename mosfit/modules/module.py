@@ -1,8 +1,14 @@
+import numpy as np
+
+
 class Module:
     def __init__(self, name, pool, **kwargs):
         self._name = name
         self._log = False
         self._pool = pool
+        self._batchable = False
+        self._root_specific = False
+        self._free_inputs = set()
 
     def process(self, **kwargs):
         return {}
@@ -16,6 +22,31 @@ class Module:
     def is_log(self):
         return self._log
 
+    def is_batchable(self):
+        """Return whether `process` accepts inputs with a leading walker axis.
+        Array outputs of such a call must have the walker axis too, other
+        outputs are taken to be the same for all walkers.
+        """
+        return self._batchable
+
+    def is_root_specific(self):
+        """Return whether outputs differ depending on the root being run.
+        """
+        return self._root_specific
+
+    def set_free_inputs(self, tasks):
+        """Set the names of the tasks this module depends upon whose outputs
+        vary with the free parameters.
+        """
+        self._free_inputs = set(tasks)
+
+    def per_time(self, value):
+        """Return a parameter such that it broadcasts against arrays over
+        times; a leading walker axis is lined up with that of the times.
+        """
+        value = np.asarray(value, dtype=float)
+        return value.reshape(value.shape + (1, )) if value.ndim else value
+
     def handle_requests(self, **kwargs):
         pass
 
@@ -1,5 +1,3 @@
-from math import isnan
-
 import numpy as np
 from mosfit.constants import LIKELIHOOD_FLOOR
 from mosfit.modules.module import Module
@@ -14,38 +12,39 @@ class Likelihood(Module):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._preprocessed = False
+        self._batchable = True
 
     def process(self, **kwargs):
         self.preprocess(**kwargs)
-        self._model_mags = kwargs['model_magnitudes']
-        self._fractions = kwargs['fractions']
-        if min(self._fractions) < 0.0 or max(self._fractions) > 1.0:
-            return {'value': LIKELIHOOD_FLOOR}
-        for mi, mag in enumerate(self._model_mags):
-            if (not self._upper_limits[mi] and
-                (isnan(mag) or not np.isfinite(mag))):
-                return {'value': LIKELIHOOD_FLOOR}
-        self._variance2 = kwargs['variance']**2
+        # Any leading axis of the model magnitudes is over walkers.
+        self._model_mags = np.asarray(kwargs['model_magnitudes'], dtype=float)
+        self._fractions = np.asarray(kwargs['fractions'], dtype=float)
+        # Squares are taken with `np.float_power`, which rounds as the
+        # scalar `**` operator does, so scores do not depend upon batching.
+        self._variance2 = np.float_power(self.per_time(kwargs['variance']),
+                                         2.0)
+        x = self._model_mags[..., self._observed]
+        y = self._obs_mags
+
+        # Only upper limits may have undefined model magnitudes.
+        floored = np.any(
+            (self._fractions < 0.0) | (self._fractions > 1.0), axis=-1) | (
+                np.any(self._detected & ~np.isfinite(x), axis=-1))
 
-        sum_members = [
-            (x - y if not u or (x < y and not isnan(x)) else 0.0)**2 / (
-                (el if x > y else eu)**2 + self._variance2) +
-            np.log(self._variance2 + 0.5 * (el**2 + eu**2))
-            for x, y, eu, el, u in zip(self._model_mags, [
-                i for i, o in zip(self._mags, self._observed) if o
-            ], [i for i, o in zip(self._e_u_mags, self._observed) if o], [
-                i for i, o in zip(self._e_l_mags, self._observed) if o
-            ], [i for i, o in zip(self._upper_limits, self._observed) if o])
-        ]
-        value = -0.5 * np.sum(sum_members)
-        if isnan(value):
-            return {'value': LIKELIHOOD_FLOOR}
+        # Upper limits only count when the model is brighter.
+        with np.errstate(invalid='ignore'):
+            diff = np.where(self._detected | (x < y), x - y, 0.0)
+            err2 = np.where(x > y, self._e_l_mags2, self._e_u_mags2)
+        sum_members = np.float_power(diff, 2.0) / (
+            err2 + self._variance2) + np.log(self._variance2 + self._e_mean2)
+        value = -0.5 * np.sum(sum_members, axis=-1)
+        value = np.where(floored | np.isnan(value), LIKELIHOOD_FLOOR, value)
         # if min(x) < 0.0:
         #     value = value + self._n_mags * np.sum([y for y in x if y < 0.0])
         # if max(x) > 1.0:
         #     value = value + self._n_mags * np.sum(
         #         [1.0 - y for y in x if y > 1.0])
-        return {'value': value}
+        return {'value': value[()]}
 
     def preprocess(self, **kwargs):
         if self._preprocessed:
@@ -55,19 +54,28 @@ class Likelihood(Module):
         self._e_l_mags = kwargs['e_lower_magnitudes']
         self._e_mags = kwargs['e_magnitudes']
         self._upper_limits = kwargs['upperlimits']
-        self._observed = kwargs['observed']
-        self._e_u_mags = [
-            kwargs['default_upper_limit_error']
-            if (e == '' and eu == '' and self._upper_limits[i]) else
-            (kwargs['default_no_error_bar_error']
-             if (e == '' and eu == '') else (e if eu == '' else eu))
-            for i, (e, eu) in enumerate(zip(self._e_mags, self._e_u_mags))
-        ]
-        self._e_l_mags = [
-            0.0 if self._upper_limits[i] else
-            (kwargs['default_no_error_bar_error']
-             if (e == '' and el == '') else (e if el == '' else el))
-            for i, (e, el) in enumerate(zip(self._e_mags, self._e_l_mags))
-        ]
+        self._observed = np.asarray(kwargs['observed'], dtype=bool)
+        # Missing errors are NaN.
+        no_error = np.isnan(self._e_mags) & np.isnan(self._e_u_mags)
+        self._e_u_mags = np.where(
+            no_error, np.where(self._upper_limits,
+                               kwargs['default_upper_limit_error'],
+                               kwargs['default_no_error_bar_error']),
+            np.where(
+                np.isnan(self._e_u_mags), self._e_mags, self._e_u_mags))
+        no_error = np.isnan(self._e_mags) & np.isnan(self._e_l_mags)
+        self._e_l_mags = np.where(
+            self._upper_limits, 0.0,
+            np.where(no_error, kwargs['default_no_error_bar_error'],
+                     np.where(
+                         np.isnan(self._e_l_mags), self._e_mags,
+                         self._e_l_mags)))
         self._n_mags = len(self._mags)
+
+        # Arrays used for every score, the data are the observed points.
+        self._obs_mags = np.asarray(self._mags, dtype=float)
+        self._detected = ~np.asarray(self._upper_limits, dtype=bool)
+        self._e_u_mags2 = np.float_power(self._e_u_mags, 2.0)
+        self._e_l_mags2 = np.float_power(self._e_l_mags, 2.0)
+        self._e_mean2 = 0.5 * (self._e_l_mags2 + self._e_u_mags2)
         self._preprocessed = True
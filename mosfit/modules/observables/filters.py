@@ -1,4 +1,5 @@
 import csv
+import hashlib
 import json
 import os
 import shutil
@@ -7,10 +8,14 @@ from collections import OrderedDict
 
 import numpy as np
 from astropy.io.votable import parse as voparse
+from extinction import odonnell94
 
 from mosfit.constants import AB_OFFSET, FOUR_PI, MAG_FAC, MPC_CGS
 from mosfit.modules.module import Module
-from mosfit.utils import listify, print_inline
+from mosfit.modules.seds.blackbody import blackbody
+from mosfit.modules.seds.extinction import Extinction
+from mosfit.modules.seds.sed import SED
+from mosfit.utils import bcast_arrays, listify, print_inline, trapezoid
 
 CLASS_NAME = 'Filters'
 
@@ -19,33 +24,67 @@ class Filters(Module):
     """Band-pass filters.
     """
 
+    CACHE_VERSION = 1
+    DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+    CACHE_PATH = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.realpath(__file__)))), 'cache', 'filters.npz')
+
+    # Grids of the band flux tables used when the blackbody SED is in lookup
+    # mode: log temperature, host A_V, and redshift and MW E(B-V) (only used
+    # when they depend upon free parameters, otherwise tables are computed
+    # for their exact values). Interpolating in temperature and host A_V is
+    # accurate to 5e-4 mag for T > 1.5e3 K, A_V < 60, and rest wavelengths
+    # above 2500 A; to 1e-3 mag down to 1e3 K; and to 5e-3 mag at bluer rest
+    # wavelengths, where the O'Donnell curve is steep. Interpolating in E(B-V)
+    # adds less than 1e-5 mag. Interpolating in redshift adds less than 1e-5
+    # mag, or up to 1e-3 mag per unit of host A_V for bands whose rest
+    # wavelengths straddle a break of the O'Donnell curve.
+    LOOKUP_LOG_T = np.linspace(2.5, 7.0, 901)
+    LOOKUP_AV = np.linspace(0.0, 60.0, 121)
+    LOOKUP_DZ = 0.005
+    LOOKUP_DEBV = 0.02
+
+    # Number of tables kept, the least recently used are dropped. A table
+    # takes about 1 MB per loaded band.
+    LOOKUP_CACHE_SIZE = 8
+
+    # Number of sets of observation lists whose band indices are kept, only
+    # a few (one per root) are in use at a time.
+    BAND_INDICES_CACHE_SIZE = 4
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._preprocessed = False
         self._bands = []
+        self._sample_wavelengths = None
+        self._batchable = True
+        self._lookup_tables = OrderedDict()
 
         bands = kwargs.get('bands', '')
         bands = listify(bands)
 
-        syst_syns = {'': 'Vega', 'SDSS': 'AB'}
-
-        dir_path = os.path.dirname(os.path.realpath(__file__))
+        dir_path = self.DIR_PATH
         band_list = []
 
+        rules = None
         if self._pool.is_master():
-            with open(os.path.join(dir_path, 'filterrules.json')) as f:
-                filterrules = json.load(f, object_pairs_hook=OrderedDict)
-            for rank in range(1, self._pool.size + 1):
-                self._pool.comm.send(filterrules, dest=rank, tag=5)
-        else:
-            filterrules = self._pool.comm.recv(source=0, tag=5)
+            with open(os.path.join(dir_path, 'filterrules.json'), 'rb') as f:
+                rules = [np.frombuffer(f.read(), dtype=np.uint8)]
+        rules = bcast_arrays(self._pool, rules)
+        filterrules = json.loads(
+            rules[0].tobytes().decode('utf-8'), object_pairs_hook=OrderedDict)
 
         for bi, band in enumerate(bands):
             for rule in filterrules:
+                # Systems are deduplicated in a fixed order so that every
+                # process builds the same list of bands.
+                systems = list(
+                    OrderedDict.fromkeys([''] + rule.get('systems', []) +
+                                         ['AB', 'Vega']))
                 sysinstperms = [
                     {'systems': xx, 'instruments': yy, 'bandsets': zz}
-                    for xx in list(
-                        set(rule.get('systems', []) + ['AB', 'Vega', '']))
+                    for xx in systems
                     for yy in rule.get('instruments', [''])
                     for zz in rule.get('bandsets', [''])
                 ]
@@ -62,6 +101,11 @@ class Filters(Module):
         self._band_bsets = [x['bandsets'] for x in self._unique_bands]
         self._band_systs = [x['systems'] for x in self._unique_bands]
         self._band_names = [x['name'] for x in self._unique_bands]
+        self._band_name_indices = OrderedDict()
+        for bi, name in enumerate(self._band_names):
+            self._band_name_indices.setdefault(name, []).append(bi)
+        self._band_index_memo = {}
+        self._band_indices_cache = OrderedDict()
         self._n_bands = len(self._unique_bands)
         self._band_wavelengths = [[] for i in range(self._n_bands)]
         self._transmissions = [[] for i in range(self._n_bands)]
@@ -70,162 +114,441 @@ class Filters(Module):
         self._filter_integrals = [0.0] * self._n_bands
         self._band_offsets = [0.0] * self._n_bands
 
+        self._loaded = [False] * self._n_bands
+        self._dir_path = dir_path
+
+    def load_bands(self, bands=None):
+        """Read the filter curves of the bands matching a list of (name,
+        instrument, bandset, system) tuples, or of every band if `bands` is
+        None. Bands that were already loaded are skipped. Must be called on
+        every process with the same arguments.
+        """
+        if bands is None:
+            indices = range(self._n_bands)
+        else:
+            indices = set()
+            for band in bands:
+                indices.add(self.find_band_index(*band))
+                indices.add(self.find_band_index(band[0]))
+        indices = [i for i in sorted(indices) if not self._loaded[i]]
+        if not indices:
+            return
+
+        syst_syns = {'': 'Vega', 'SDSS': 'AB'}
+        dir_path = self._dir_path
+
+        # The master reads the filters, which are then broadcast to the
+        # other processes as wavelengths, transmissions, integrals, and zero
+        # points packed into one buffer.
+        arrays = None
         if self._pool.is_master():
             vo_tabs = {}
-
-        for i, band in enumerate(self._unique_bands):
-            if self._pool.is_master():
-                systems = ['AB']
-                zps = [0.0]
+            signature = self.cache_signature(dir_path)
+            cache = self.read_cache(signature)
+            cache_size = len(cache)
+            entries = []
+            for i in indices:
+                band = self._unique_bands[i]
+                key = band.get('path', '')
                 if 'SVO' in band:
                     photsystem = self._band_systs[i]
                     if photsystem in syst_syns:
                         photsystem = syst_syns[photsystem]
-                    if photsystem not in systems:
-                        systems.append(photsystem)
-                    zpfluxes = []
-                    for sys in systems:
-                        svopath = band['SVO'] + '/' + sys
-                        path = os.path.join(dir_path, 'filters',
-                                            svopath.replace('/', '_') + '.dat')
-
-                        xml_path = os.path.join(
-                            dir_path, 'filters',
-                            svopath.replace('/', '_') + '.xml')
-                        if not os.path.exists(xml_path):
-                            print('Downloading bandpass {} from SVO.'.format(
-                                svopath))
-                            try:
-                                response = urllib.request.urlopen(
-                                    'http://svo2.cab.inta-csic.es'
-                                    '/svo/theory/fps3/'
-                                    'fps.php?PhotCalID=' + svopath,
-                                    timeout=10)
-                            except:
-                                print_inline(
-                                    'Warning: Could not download SVO filter '
-                                    '(are you online?), using cached filter.')
-                            else:
-                                with open(xml_path, 'wb') as f:
-                                    shutil.copyfileobj(response, f)
-
-                        if os.path.exists(xml_path):
-                            if svopath not in vo_tabs:
-                                vo_tabs[svopath] = voparse(xml_path)
-                            else:
-                                continue
-                            vo_tab = vo_tabs[svopath]
-                            # need to account for zeropoint type
-                            for resource in vo_tab.resources:
-                                for param in resource.params:
-                                    if param.name == 'ZeroPoint':
-                                        zpfluxes.append(param.value)
-                                        if sys != 'AB':
-                                            # 0th element is AB flux
-                                            zps.append(2.5 * np.log10(
-                                                zpfluxes[0] / zpfluxes[-1]))
-                                    else:
-                                        continue
-                            vo_dat = vo_tab.get_first_table().array
-                            bi = max(
-                                next((i for i, x in enumerate(vo_dat)
-                                      if x[1]), 0) - 1, 0)
-                            ei = -max(
-                                next((i
-                                      for i, x in enumerate(reversed(vo_dat))
-                                      if x[1]), 0) - 1, 0)
-                            vo_dat = vo_dat[bi:ei if ei else len(vo_dat)]
-                            vo_string = '\n'.join([
-                                ' '.join([str(y) for y in x]) for x in vo_dat
-                            ])
-                            with open(path, 'w') as f:
-                                f.write(vo_string)
-                        else:
-                            print('Error: Could not read SVO filter!')
-                            raise RuntimeError
-                else:
-                    path = band['path']
-
-                with open(os.path.join(dir_path, 'filters', path), 'r') as f:
-                    rows = []
-                    for row in csv.reader(
-                            f, delimiter=' ', skipinitialspace=True):
-                        rows.append([float(x) for x in row[:2]])
-                for rank in range(1, self._pool.size + 1):
-                    self._pool.comm.send(rows, dest=rank, tag=3)
-                    self._pool.comm.send(zps, dest=rank, tag=4)
-            else:
-                rows = self._pool.comm.recv(source=0, tag=3)
-                zps = self._pool.comm.recv(source=0, tag=4)
-
-            self._band_wavelengths[i], self._transmissions[i] = list(
-                map(list, zip(*rows)))
-            self._min_waves[i] = min(self._band_wavelengths[i])
-            self._max_waves[i] = max(self._band_wavelengths[i])
-            self._filter_integrals[i] = np.trapz(self._transmissions[i],
-                                                 self._band_wavelengths[i])
+                    key = band['SVO'] + '/' + photsystem
+                if key not in cache:
+                    cache[key] = self.read_filter(band, key, dir_path,
+                                                  vo_tabs)
+                entries.append(cache[key])
+            arrays = ([x[0] for x in entries] + [x[1] for x in entries] +
+                      [np.array([x[2] for x in entries]),
+                       np.array([x[3] for x in entries])])
+        arrays = bcast_arrays(self._pool, arrays)
+
+        nb = len(indices)
+        for ii, i in enumerate(indices):
+            band = self._unique_bands[i]
+            wavs = arrays[ii]
+            self._band_wavelengths[i] = wavs
+            self._transmissions[i] = arrays[nb + ii]
+            self._min_waves[i] = min(wavs)
+            self._max_waves[i] = max(wavs)
+            self._filter_integrals[i] = arrays[2 * nb][ii]
+            zp = arrays[2 * nb + 1][ii]
 
             if 'offset' in band:
                 self._band_offsets[i] = band['offset']
             elif 'SVO' in band:
-                self._band_offsets[i] = zps[-1]
+                self._band_offsets[i] = zp
+            self._loaded[i] = True
+        self._lookup_tables = OrderedDict()
+
+        # Files may have been rewritten while reading new filters, so the
+        # signature is recomputed before storing.
+        if self._pool.is_master() and len(cache) > cache_size:
+            self.write_cache(self.cache_signature(dir_path), cache)
+
+    def read_filter(self, band, key, dir_path, vo_tabs):
+        """Read the transmission curve of a band, downloading it from the SVO
+        if necessary. Returns wavelengths, transmissions, the integral of the
+        transmission, and the zero point offset relative to AB.
+        """
+        zp = 0.0
+        if 'SVO' in band:
+            photsystem = key.split('/')[-1]
+            systems = ['AB'] if photsystem == 'AB' else ['AB', photsystem]
+            zpfluxes = []
+            for sys in systems:
+                svopath = band['SVO'] + '/' + sys
+                path = os.path.join(dir_path, 'filters',
+                                    svopath.replace('/', '_') + '.dat')
+
+                xml_path = os.path.join(dir_path, 'filters',
+                                        svopath.replace('/', '_') + '.xml')
+                if not os.path.exists(xml_path):
+                    print('Downloading bandpass {} from SVO.'.format(svopath))
+                    try:
+                        response = urllib.request.urlopen(
+                            'http://svo2.cab.inta-csic.es'
+                            '/svo/theory/fps3/'
+                            'fps.php?PhotCalID=' + svopath,
+                            timeout=10)
+                    except:
+                        print_inline(
+                            'Warning: Could not download SVO filter (are you '
+                            'online?), using cached filter.')
+                    else:
+                        with open(xml_path, 'wb') as f:
+                            shutil.copyfileobj(response, f)
+
+                if not os.path.exists(xml_path):
+                    print('Error: Could not read SVO filter!')
+                    raise RuntimeError
+                new_tab = svopath not in vo_tabs
+                if new_tab:
+                    vo_tabs[svopath] = voparse(xml_path)
+                vo_tab = vo_tabs[svopath]
+                # need to account for zeropoint type
+                for resource in vo_tab.resources:
+                    for param in resource.params:
+                        if param.name == 'ZeroPoint':
+                            zpfluxes.append(param.value)
+                            if sys != 'AB':
+                                # 0th element is AB flux
+                                zp = 2.5 * np.log10(zpfluxes[0] /
+                                                    zpfluxes[-1])
+                if not new_tab:
+                    continue
+                vo_dat = vo_tab.get_first_table().array
+                bi = max(
+                    next((i for i, x in enumerate(vo_dat) if x[1]), 0) - 1, 0)
+                ei = -max(
+                    next((i for i, x in enumerate(reversed(vo_dat)) if x[1]),
+                         0) - 1, 0)
+                vo_dat = vo_dat[bi:ei if ei else len(vo_dat)]
+                vo_string = '\n'.join(
+                    [' '.join([str(y) for y in x]) for x in vo_dat])
+                with open(path, 'w') as f:
+                    f.write(vo_string)
+        else:
+            path = band['path']
+
+        with open(os.path.join(dir_path, 'filters', path), 'r') as f:
+            rows = []
+            for row in csv.reader(f, delimiter=' ', skipinitialspace=True):
+                rows.append([float(x) for x in row[:2]])
+        wavs, trans = [np.array(x) for x in zip(*rows)]
+        return wavs, trans, trapezoid(trans, wavs), zp
+
+    def cache_signature(self, dir_path):
+        """Return a string identifying the filter rules and the state of the
+        filter files, used to determine if the filter cache is stale.
+        """
+        sha = hashlib.sha1(str(self.CACHE_VERSION).encode())
+        with open(os.path.join(dir_path, 'filterrules.json'), 'rb') as f:
+            sha.update(f.read())
+        filter_dir = os.path.join(dir_path, 'filters')
+        for fname in sorted(os.listdir(filter_dir)):
+            stat = os.stat(os.path.join(filter_dir, fname))
+            sha.update('{} {} {}'.format(fname, stat.st_size,
+                                         stat.st_mtime).encode())
+        return sha.hexdigest()
+
+    def read_cache(self, signature):
+        """Read previously parsed filters from the filter cache, if it exists
+        and matches `signature`.
+        """
+        cache = OrderedDict()
+        if not os.path.exists(self.CACHE_PATH):
+            return cache
+        try:
+            with np.load(self.CACHE_PATH) as npz:
+                if str(npz['signature']) != signature:
+                    return cache
+                bounds = npz['bounds']
+                wavs = npz['wavelengths']
+                trans = npz['transmissions']
+                for ki, key in enumerate(npz['keys']):
+                    sl = slice(bounds[ki], bounds[ki + 1])
+                    cache[str(key)] = (wavs[sl], trans[sl],
+                                       float(npz['integrals'][ki]),
+                                       float(npz['zps'][ki]))
+        except (IOError, OSError, KeyError, ValueError):
+            return OrderedDict()
+        return cache
+
+    def write_cache(self, signature, cache):
+        """Write parsed filters to the filter cache. Failure to write is not
+        an error, the filters will be parsed again next time.
+        """
+        keys = list(cache.keys())
+        entries = [cache[x] for x in keys]
+        bounds = np.cumsum([0] + [len(x[0]) for x in entries])
+        tmp_path = self.CACHE_PATH + '.tmp.npz'
+        try:
+            np.savez(
+                tmp_path,
+                signature=np.array(signature),
+                keys=np.array(keys),
+                bounds=bounds,
+                wavelengths=np.concatenate([x[0] for x in entries]),
+                transmissions=np.concatenate([x[1] for x in entries]),
+                integrals=np.array([x[2] for x in entries]),
+                zps=np.array([x[3] for x in entries]))
+            os.replace(tmp_path, self.CACHE_PATH)
+        except (IOError, OSError):
+            pass
 
     def find_band_index(self, name, instrument='', bandset='', system=''):
-        for bi, band in enumerate(self._unique_bands):
-            if (name == band['name'] and instrument in self._band_insts[bi] and
-                    bandset in self._band_bsets[bi] and
-                    system in self._band_systs[bi]):
-                return bi
-            if (name == band['name'] and instrument in self._band_insts[bi] and
-                    system in self._band_systs[bi]):
-                return bi
-            if (name == band['name'] and system in self._band_systs[bi]):
-                return bi
-            if (name == band['name'] and '' in self._band_insts[bi] and
-                    '' in self._band_bsets[bi] and '' in self._band_systs[bi]):
+        """Return the index of the first band matching `name` that is
+        compatible with the given instrument, bandset, and system. Results
+        are memoized.
+        """
+        key = (name, instrument, bandset, system)
+        bi = self._band_index_memo.get(key)
+        if bi is not None:
+            return bi
+        # Only bands with a matching name are candidates, they are tested
+        # against the same fallbacks in the same order as a full scan would.
+        for bi in self._band_name_indices.get(name, []):
+            insts = self._band_insts[bi]
+            bsets = self._band_bsets[bi]
+            systs = self._band_systs[bi]
+            if ((instrument in insts and bandset in bsets and
+                 system in systs) or
+                    (instrument in insts and system in systs) or
+                    system in systs or
+                    ('' in insts and '' in bsets and '' in systs)):
+                self._band_index_memo[key] = bi
                 return bi
         raise ValueError('Cannot find band index!')
 
+    def find_band_indices(self,
+                          bands,
+                          instruments=None,
+                          bandsets=None,
+                          systems=None):
+        """Return an array of the band indices of a list of observations. The
+        array is computed once per set of observation lists and reused
+        afterwards, the lists are not expected to change. Only the most
+        recently used sets are kept.
+        """
+        lists = (bands, instruments, bandsets, systems)
+        key = tuple(id(x) for x in lists)
+        cache = self._band_indices_cache
+        cached = cache.get(key)
+        if cached is not None and all(
+                x is y for x, y in zip(cached[0], lists)):
+            cache.move_to_end(key)
+            return cached[1]
+        columns = [[''] * len(bands) if x is None else x for x in lists]
+        indices = np.array(
+            [self.find_band_index(*x) for x in zip(*columns)], dtype=int)
+        # Keep references to the lists so their ids are not reused.
+        cache[key] = (lists, indices)
+        cache.move_to_end(key)
+        while len(cache) > self.BAND_INDICES_CACHE_SIZE:
+            cache.popitem(last=False)
+        return indices
+
     def process(self, **kwargs):
         old_bands = self._bands
         self._bands = kwargs['all_bands']
-        if old_bands != self._bands:
-            self._band_indices = list(map(self.find_band_index, self._bands))
-        self._dxs = []
-        for bi in self._band_indices:
-            wavs = kwargs['samplewavelengths'][bi]
-            self._dxs.append(wavs[1] - wavs[0])
-        self._dist_const = np.log10(FOUR_PI * (kwargs['lumdist'] * MPC_CGS)**2)
+        if (old_bands is not self._bands or
+                kwargs['samplewavelengths'] is not self._sample_wavelengths):
+            self._band_indices = self.find_band_indices(self._bands)
+            self.compute_weights(kwargs['samplewavelengths'])
+        self._dist_const = np.log10(FOUR_PI * (np.asarray(kwargs[
+            'lumdist']) * MPC_CGS)**2)
         self._luminosities = kwargs['luminosities']
         self._systems = kwargs['systems']
         self._instruments = kwargs['instruments']
         self._bandsets = kwargs['bandsets']
-        eff_fluxes = []
-        offsets = []
-        for li, lum in enumerate(self._luminosities):
-            bi = self._band_indices[li]
-            offsets.append(self._band_offsets[bi])
-            wavs = kwargs['samplewavelengths'][bi]
-            itrans = np.interp(wavs, self._band_wavelengths[bi],
-                               self._transmissions[bi])
-            yvals = [x * y for x, y in zip(itrans, kwargs['seds'][li])]
-            eff_fluxes.append(
-                np.trapz(
-                    yvals, dx=self._dxs[bi]) / self._filter_integrals[bi])
-        mags = self.abmag(eff_fluxes, offsets)
+        if kwargs['seds'] is None:
+            return {'model_magnitudes': self.lookup_magnitudes(**kwargs)}
+        # SEDs have shape (..., n_obs, N_PTS), any leading axes are walkers.
+        seds = np.asarray(kwargs['seds'], dtype=float)
+        eff_fluxes = np.einsum('...ij,ij->...i', seds, self._obs_weights)
+        mags = self.abmag(eff_fluxes, self._obs_offsets)
         return {'model_magnitudes': mags}
 
+    def compute_weights(self, sample_wavelengths):
+        """Fold the interpolated transmission, the trapezoidal rule weights,
+        and the filter integral of each band into a single weight vector, so
+        that the effective flux of an observation is a dot product with its
+        SED. Weights are stacked into one row per observation.
+        """
+        self._sample_wavelengths = sample_wavelengths
+        band_weights = dict([(bi, self.band_weights(bi))
+                             for bi in set(self._band_indices)])
+        self._obs_weights = np.array(
+            [band_weights[bi] for bi in self._band_indices])
+        self._obs_offsets = np.array(
+            [self._band_offsets[bi] for bi in self._band_indices])
+
+    def band_weights(self, bi):
+        """Return the integration weights of band `bi` at its sample
+        wavelengths.
+        """
+        wavs = np.array(self._sample_wavelengths[bi], dtype=float)
+        itrans = np.interp(wavs, self._band_wavelengths[bi],
+                           self._transmissions[bi])
+        tweights = np.full(len(wavs), wavs[1] - wavs[0])
+        tweights[[0, -1]] *= 0.5
+        return itrans * tweights / self._filter_integrals[bi]
+
+    def lookup_magnitudes(self, **kwargs):
+        """Compute model magnitudes of a blackbody photosphere by
+        interpolating tabulated band fluxes instead of integrating SEDs.
+        """
+        radius_phot = np.asarray(kwargs['radiusphot'], dtype=float)
+        temperature_phot = np.asarray(kwargs['temperaturephot'], dtype=float)
+        redshift = np.asarray(kwargs['redshift'], dtype=float)
+        ebv = np.asarray(kwargs.get('ebv', 0.0), dtype=float)
+        av_host = np.asarray(
+            kwargs.get('nhhost', 0.0), dtype=float) / Extinction.NH_PER_AV
+        if redshift.ndim or ebv.ndim:
+            # Tables depend upon the redshift and MW extinction, batches of
+            # walkers that differ in those are looked up one at a time.
+            redshift = np.broadcast_to(redshift, radius_phot.shape[:1])
+            ebv = np.broadcast_to(ebv, radius_phot.shape[:1])
+            av_host = np.broadcast_to(av_host, radius_phot.shape[:1])
+            log_fluxes = np.array([
+                self.lookup_log_fluxes(t, a, z, e)
+                for t, a, z, e in zip(temperature_phot, av_host, redshift,
+                                      ebv)
+            ])
+        else:
+            log_fluxes = self.lookup_log_fluxes(
+                temperature_phot, av_host[..., None], float(redshift),
+                float(ebv))
+        dist_const = np.reshape(self._dist_const,
+                                np.shape(self._dist_const) + (1, ))
+        with np.errstate(divide='ignore'):
+            log_radii = 2.0 * np.log10(radius_phot)
+        return AB_OFFSET - self._obs_offsets - MAG_FAC * (
+            log_radii + log_fluxes - dist_const)
+
+    def lookup_log_fluxes(self, temperatures, av_host, redshift, ebv):
+        """Return the log band fluxes of a unit radius blackbody for the band
+        of each observation, interpolated on the lookup tables.
+        """
+        log_fluxes = 0.0
+        for z, zw in self.grid_weights(redshift, 'redshift', self.LOOKUP_DZ):
+            for e, ew in self.grid_weights(ebv, 'ebv', self.LOOKUP_DEBV):
+                log_fluxes = log_fluxes + zw * ew * self.interpolate_table(
+                    self.lookup_table(z, e), temperatures, av_host)
+        return log_fluxes
+
+    def grid_weights(self, value, task, step):
+        """Return the values tables are needed for to interpolate at `value`,
+        with their weights: `value` itself, or if the output of `task`
+        varies with the free parameters the two enclosing points of a grid
+        with spacing `step`.
+        """
+        if task not in self._free_inputs:
+            return [(value, 1.0)]
+        vi = value / step
+        vk = np.floor(vi)
+        frac = vi - vk
+        return [(vk * step, 1.0 - frac), ((vk + 1) * step, frac)]
+
+    def interpolate_table(self, lookup, temperatures, av_host):
+        """Bilinearly interpolate a band flux table, with the rows of each
+        band, in log temperature and host A_V, extrapolating linearly off the
+        grids.
+        """
+        rows, table = lookup
+        log_t = self.LOOKUP_LOG_T
+        avs = self.LOOKUP_AV
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ti = (np.log10(temperatures) - log_t[0]) / (log_t[1] - log_t[0])
+        ti = np.nan_to_num(ti, nan=0.0, neginf=0.0)
+        tk = np.clip(np.floor(ti), 0, len(log_t) - 2).astype(int)
+        tf = ti - tk
+        ai = (av_host - avs[0]) / (avs[1] - avs[0])
+        ak = np.clip(np.floor(ai), 0, len(avs) - 2).astype(int)
+        af = ai - ak
+        rows = rows[self._band_indices]
+        return ((1.0 - tf) * ((1.0 - af) * table[rows, tk, ak] +
+                              af * table[rows, tk, ak + 1]) +
+                tf * ((1.0 - af) * table[rows, tk + 1, ak] +
+                      af * table[rows, tk + 1, ak + 1]))
+
+    def lookup_table(self, redshift, ebv):
+        """Return the table of log band fluxes of a unit radius blackbody on
+        the temperature and host A_V grids for every loaded band, computed
+        with the same sample wavelengths and weights as the SED integration,
+        and the row of the table of each band.
+        """
+        key = (redshift, ebv)
+        lookup = self._lookup_tables.get(key)
+        if lookup is not None:
+            self._lookup_tables.move_to_end(key)
+            return lookup
+        zp1 = 1.0 + redshift
+        temperatures = 10.0**self.LOOKUP_LOG_T
+        bands = [bi for bi in range(len(self._band_names))
+                 if self._loaded[bi] and self._sample_wavelengths[bi]]
+        rows = np.zeros(len(self._band_names), dtype=int)
+        rows[bands] = np.arange(len(bands))
+        table = np.empty((len(bands), len(temperatures), len(
+            self.LOOKUP_AV)))
+        for ri, bi in enumerate(bands):
+            wavs = np.array(self._sample_wavelengths[bi], dtype=float)
+            weights = self.band_weights(bi) * 10.0**(-0.4 * odonnell94(
+                wavs, Extinction.MW_RV * ebv, Extinction.MW_RV))
+            rest_freqs = SED.C_CONST / wavs * zp1
+            with np.errstate(over='ignore'):
+                planck = blackbody.FLUX_CONST * rest_freqs**3 / np.expm1(
+                    blackbody.X_CONST * rest_freqs / temperatures[:, None])
+            host = 10.0**(-0.4 * np.outer(
+                self.LOOKUP_AV, odonnell94(wavs / zp1, 1.0, Extinction.MW_RV)))
+            fluxes = np.einsum('tj,aj,j->ta', planck, host, weights)
+            table[ri] = np.log10(np.maximum(fluxes, 1.0e-300))
+        lookup = (rows, table)
+        self._lookup_tables[key] = lookup
+        while len(self._lookup_tables) > self.LOOKUP_CACHE_SIZE:
+            self._lookup_tables.popitem(last=False)
+        return lookup
+
     def band_names(self):
         return self._band_names
 
     def abmag(self, eff_fluxes, offsets):
-        return [(np.inf if x == 0.0 else
-                 (AB_OFFSET - y - MAG_FAC * (np.log10(x) - self._dist_const)))
-                for x, y in zip(eff_fluxes, offsets)]
+        dist_const = np.reshape(self._dist_const,
+                                np.shape(self._dist_const) + (1, ))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mags = AB_OFFSET - offsets - MAG_FAC * (
+                np.log10(eff_fluxes) - dist_const)
+        return np.where(eff_fluxes == 0.0, np.inf, mags)
 
     def request(self, request):
         if request == 'filters':
             return self
         elif request == 'band_wave_ranges':
-            return list(map(list, zip(*[self._min_waves, self._max_waves])))
+            # Without a prior call to `load_bands`, all bands are loaded.
+            if not any(self._loaded):
+                self.load_bands()
+            return [[x, y] if l else None for x, y, l in zip(
+                self._min_waves, self._max_waves, self._loaded)]
         return []
@@ -1,3 +1,6 @@
+import os
+
+import numpy as np
 from astropy import units as un
 from astropy.cosmology import Planck15 as cosmo
 from astropy.cosmology import z_at_value
@@ -10,6 +13,22 @@ class Redshift(Parameter):
     """Redshift parameter that depends on luminosity distance.
     """
 
+    # Redshifts are found from luminosity distances by interpolating log z
+    # against log D_L in a table, which is only used if accurate to
+    # Z_TOLERANCE in z / z. Distances outside of the table use `z_at_value`.
+    CACHE_VERSION = 1
+    CACHE_PATH = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.realpath(__file__)))), 'cache', 'redshifts.npz')
+    Z_MIN = 1.0e-5
+    Z_MAX = 20.0
+    N_Z = 20000
+    Z_TOLERANCE = 1.0e-8
+
+    # Table of log luminosity distances and log redshifts, built once per
+    # process.
+    _table = None
+
     def process(self, **kwargs):
         """Initialize a parameter based upon either a fixed value or a
         distribution, if one is defined.
@@ -21,9 +40,8 @@ class Redshift(Parameter):
                 return {}
 
             self._lum_dist = kwargs.get('lumdist', None)
-            if not self._value and self._lum_dist:
-                value = z_at_value(cosmo.luminosity_distance,
-                                   self._lum_dist * un.Mpc)
+            if not self._value and self._lum_dist is not None:
+                value = self.redshift_from_distance(self._lum_dist)
             elif self._value:
                 value = self._value
             else:
@@ -32,3 +50,88 @@ class Redshift(Parameter):
             value = self.value(kwargs['fraction'])
 
         return {self._name: value}
+
+    def redshift_from_distance(self, lum_dist):
+        """Return the redshift at luminosity distance `lum_dist` (in Mpc),
+        which may be an array.
+        """
+        lum_dist = np.asarray(lum_dist, dtype=float)
+        log_dists, log_zs = self.distance_table()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_dist = np.log(lum_dist)
+        value = np.exp(np.interp(log_dist, log_dists, log_zs))
+        outside = ~((log_dist >= log_dists[0]) & (log_dist <= log_dists[-1]))
+        for i in np.flatnonzero(outside):
+            value.flat[i] = z_at_value(cosmo.luminosity_distance,
+                                       lum_dist.flat[i] * un.Mpc).value
+        return value[()]
+
+    def distance_table(self):
+        """Return the table of log luminosity distances and log redshifts,
+        reading it from the cache or building it if needed. If it does not
+        reach the required accuracy, the table covers no distances.
+        """
+        if Redshift._table is not None:
+            return Redshift._table
+        signature = self.table_signature()
+        table = self.read_table(signature)
+        if table is None:
+            table = self.build_table()
+            if self._pool.is_master():
+                self.write_table(signature, table)
+        Redshift._table = table
+        return table
+
+    def build_table(self):
+        """Tabulate the luminosity distance on a log grid of redshifts, and
+        check the interpolation between grid points, where it is least
+        accurate.
+        """
+        zs = np.logspace(np.log10(self.Z_MIN), np.log10(self.Z_MAX), self.N_Z)
+        log_dists = np.log(cosmo.luminosity_distance(zs).to(un.Mpc).value)
+        log_zs = np.log(zs)
+        mid_zs = np.sqrt(zs[1:] * zs[:-1])
+        mid_dists = np.log(
+            cosmo.luminosity_distance(mid_zs).to(un.Mpc).value)
+        error = np.max(
+            np.abs(np.exp(np.interp(mid_dists, log_dists, log_zs)) / mid_zs -
+                   1.0))
+        if not error <= self.Z_TOLERANCE:
+            return np.array([np.inf]), np.array([0.0])
+        return log_dists, log_zs
+
+    def table_signature(self):
+        """Return a string identifying the cosmology and the table grid.
+        """
+        return '{} {} {} {} {} {}'.format(self.CACHE_VERSION, repr(cosmo),
+                                          self.Z_MIN, self.Z_MAX, self.N_Z,
+                                          self.Z_TOLERANCE)
+
+    def read_table(self, signature):
+        """Read the table from the cache, if it exists and matches
+        `signature`.
+        """
+        if not os.path.exists(self.CACHE_PATH):
+            return None
+        try:
+            with np.load(self.CACHE_PATH) as npz:
+                if str(npz['signature']) != signature:
+                    return None
+                return npz['log_dists'], npz['log_zs']
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+    def write_table(self, signature, table):
+        """Write the table to the cache. Failure to write is not an error,
+        the table will be built again next time.
+        """
+        tmp_path = self.CACHE_PATH + '.tmp.npz'
+        try:
+            np.savez(
+                tmp_path,
+                signature=np.array(signature),
+                log_dists=table[0],
+                log_zs=table[1])
+            os.replace(tmp_path, self.CACHE_PATH)
+        except (IOError, OSError):
+            pass
@@ -19,6 +19,7 @@ class densecore(photosphere):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._batchable = True
 
     def process(self, **kwargs):
         self._rest_t_explosion = kwargs['resttexplosion']
@@ -28,54 +29,88 @@ class densecore(photosphere):
         self._m_ejecta = kwargs['mejecta']
         self._kappa = kwargs['kappa']
         slope = self.PL_ENV
-        peak = np.argmax(np.array(self._luminosities))
-        rphot = []
-        Tphot = []
-        temperature_last = 1.e5
-        for li, lum in enumerate(self._luminosities):
+        lums = np.asarray(self._luminosities, dtype=float)
+        kappa = self.per_time(self._kappa)
 
-            # Radius is determined via expansion
-            radius = self._v_ejecta * KM_CGS * (
-                self._times[li] - self._rest_t_explosion) * DAY_CGS
+        # Radius is determined via expansion
+        radius = self.per_time(self._v_ejecta) * KM_CGS * (np.asarray(
+            self._times, dtype=float) - self.per_time(
+                self._rest_t_explosion)) * DAY_CGS
 
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
             # Compute density in core
-            rho_core = (3.0 * self._m_ejecta * M_SUN_CGS /
+            rho_core = (3.0 * self.per_time(self._m_ejecta) * M_SUN_CGS /
                         (4.0 * pi * radius**3))
 
-            tau_core = self._kappa * rho_core * radius
+            tau_core = kappa * rho_core * radius
 
             # Attach power-law envelope of negligible mass
-            tau_e = self._kappa * rho_core * radius / (slope - 1.0)
+            tau_e = kappa * rho_core * radius / (slope - 1.0)
 
             # Find location of photosphere in envelope/core
-            if tau_e > (2.0 / 3.0):
-                radius_phot = (2.0 * (slope - 1.0) /
-                               (3.0 * self._kappa * rho_core * radius
-                                **slope))**(1.0 / (1.0 - slope))
-            else:
-                radius_phot = slope * radius / (slope - 1.0) - 2.0 / (
-                    3.0 * self._kappa * rho_core)
+            radius_phot = np.where(
+                tau_e > (2.0 / 3.0),
+                (2.0 * (slope - 1.0) /
+                 (3.0 * kappa * rho_core * radius**slope))**(
+                     1.0 / (1.0 - slope)),
+                slope * radius / (slope - 1.0) - 2.0 /
+                (3.0 * kappa * rho_core))
 
             # Compute temperature
             # Prevent weird behaviour as R_phot -> 0
-            if tau_core > 1.:
-                temperature_phot = (lum / (radius_phot
-                                           **2 * self.STEF_CONST))**0.25
-                if li > peak and temperature_phot > temperature_last:
-                    temperature_phot = temperature_last
-                    radius_phot = (lum / (temperature_phot
-                                          **4 * self.STEF_CONST))**0.5
-            else:
-                temperature_phot = temperature_last
-                radius_phot = (lum / (temperature_phot
-                                      **4 * self.STEF_CONST))**0.5
-
-            temperature_last = temperature_phot
-
-            rphot.append(radius_phot)
-
-            Tphot.append(temperature_phot)
-
-        Tphot[0] = Tphot[1]
-
-        return {'radiusphot': rphot, 'temperaturephot': Tphot}
+            thick = tau_core > 1.
+            temperature_raw = (lums / (radius_phot**2 * self.STEF_CONST))**0.25
+
+        # Where the core is thin the previous temperature is kept (1e5 K
+        # before any thick point).
+        indices = np.arange(lums.shape[-1])
+        last_thick = np.maximum.accumulate(
+            np.where(thick, indices, -1), axis=-1)
+        temperature_phot = np.where(
+            last_thick >= 0,
+            np.take_along_axis(temperature_raw, np.maximum(last_thick, 0),
+                               axis=-1), 1.e5)
+
+        # After the peak the temperature may not rise, i.e. it is a running
+        # minimum from the peak onward.
+        peak = np.argmax(lums, axis=-1)[..., None]
+        after = indices >= peak
+        temps = np.where(after & thick, temperature_raw, np.inf)
+        temps = np.where(indices == peak, temperature_phot, temps)
+        temperature_phot = np.where(
+            after, np.minimum.accumulate(temps, axis=-1), temperature_phot)
+        # Walkers with an undefined temperature are scanned on their own.
+        for wi in np.ndindex(peak.shape[:-1]):
+            first = peak[wi][0]
+            if np.any(np.isnan(temps[wi][first:])):
+                temperature_phot[wi][first:] = self.peak_minimum(
+                    temps[wi][first:], thick[wi][first:])
+
+        # Radii of points whose temperature was kept or clamped follow from
+        # the luminosity.
+        held = ~thick | (temperature_phot < temperature_raw)
+        radius_phot = np.where(
+            held, (lums / (temperature_phot**4 * self.STEF_CONST))**0.5,
+            radius_phot)
+
+        Tphot = temperature_phot
+        Tphot[..., 0] = Tphot[..., 1]
+
+        return {'radiusphot': radius_phot, 'temperaturephot': Tphot}
+
+    def peak_minimum(self, temps, thick):
+        """Return the running minimum of the temperatures `temps` from the
+        peak onward, where an undefined temperature restarts the minimum at
+        the next thick point, as the comparisons do in a scan.
+        """
+        temps = temps.copy()
+        restarts = np.flatnonzero(np.isnan(temps))
+        bounds = [0] + [x for x in restarts if x > 0] + [len(temps)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if not np.isnan(temps[start]):
+                temps[start:end] = np.minimum.accumulate(temps[start:end])
+                continue
+            mins = np.minimum.accumulate(temps[start + 1:end])
+            mins[:np.argmax(np.append(thick[start + 1:end], True))] = np.nan
+            temps[start + 1:end] = mins
+        return temps
@@ -19,36 +19,29 @@ class temperature_floor(photosphere):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._batchable = True
 
     def process(self, **kwargs):
         self._rest_t_explosion = kwargs['resttexplosion']
         self._times = kwargs['rest_times']
-        self._luminosities = kwargs['luminosities']
+        self._luminosities = np.asarray(kwargs['luminosities'], dtype=float)
         self._temperature = kwargs['temperature']
         self._v_ejecta = kwargs['vejecta']
         self._m_ejecta = kwargs['mejecta']
         self._kappa = kwargs['kappa']
-        self._radius2 = [(self.RAD_CONST *
-                          self._v_ejecta * (x - self._rest_t_explosion))**2
-                         for x in self._times]
-        self._rec_radius2 = [
-            x / (self.STEF_CONST * self._temperature**4)
-            for x in self._luminosities
-        ]
-        rphot = []
-        Tphot = []
-        for li, lum in enumerate(self._luminosities):
-
-            radius2 = self._radius2[li]
-            rec_radius2 = self._rec_radius2[li]
-            if radius2 < rec_radius2:
-                temperature = (lum / (self.STEF_CONST * radius2))**0.25
-            else:
-                radius2 = rec_radius2
-                temperature = self._temperature
-
-            rphot.append(np.sqrt(radius2))
-
-            Tphot.append(temperature)
+        temperature = self.per_time(self._temperature)
+        self._radius2 = (self.RAD_CONST * self.per_time(self._v_ejecta) * (
+            np.asarray(self._times, dtype=float) -
+            self.per_time(self._rest_t_explosion)))**2
+        self._rec_radius2 = self._luminosities / (
+            self.STEF_CONST * temperature**4)
+
+        # The photosphere recedes once the temperature reaches the floor.
+        expanding = self._radius2 < self._rec_radius2
+        radius2 = np.where(expanding, self._radius2, self._rec_radius2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Tphot = np.where(expanding, (self._luminosities / (
+                self.STEF_CONST * radius2))**0.25, temperature)
+        rphot = np.sqrt(radius2)
 
         return {'radiusphot': rphot, 'temperaturephot': Tphot}
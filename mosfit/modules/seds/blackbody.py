@@ -22,35 +22,39 @@ class blackbody(SED):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._batchable = True
+        # In lookup mode no SEDs are computed, the filters module interpolates
+        # tabulated band fluxes of a unit blackbody instead. This pays off
+        # when many observations are modeled (on SN2006le the SED and band
+        # stage is 2x faster with its 287 observations, 7x with smoothed
+        # outputs) at a fixed redshift and E(B-V); when those are free each
+        # new grid point builds a table (~40 ms for 8 bands), and integrating
+        # the SEDs can be faster. See `Filters` for the accuracy.
+        self._lookup = kwargs.get('lookup', False)
 
     def process(self, **kwargs):
         self._luminosities = kwargs['luminosities']
         self._bands = kwargs['all_bands']
-        self._radius_phot = kwargs['radiusphot']
-        self._temperature_phot = kwargs['temperaturephot']
+        self._radius_phot = np.asarray(kwargs['radiusphot'])
+        self._temperature_phot = np.asarray(kwargs['temperaturephot'])
+        if self._lookup and kwargs.get('seds', None) is None:
+            return {'samplewavelengths': self._sample_wavelengths,
+                    'seds': None}
         xc = self.X_CONST
         fc = self.FLUX_CONST
-        temperature_phot = self._temperature_phot
-        zp1 = 1.0 + kwargs['redshift']
-        seds = []
-        for li, lum in enumerate(self._luminosities):
-            cur_band = self._bands[li]
-            bi = self._filters.find_band_index(cur_band)
-            rest_freqs = [x * zp1 for x in self._sample_frequencies[bi]]
-            wav_arr = np.array(self._sample_wavelengths[bi])
-            radius_phot = self._radius_phot[li]
-            temperature_phot = self._temperature_phot[li]
-
-            if li == 0:
-                sed = ne.evaluate(
-                    'fc * radius_phot**2 * rest_freqs**3 / '
-                    '(exp(xc * rest_freqs / temperature_phot) - 1.0)')
-            else:
-                sed = ne.re_evaluate()
-
-            sed = np.nan_to_num(sed)
-
-            seds.append(list(sed))
+        self.set_sample_rows(self._bands)
+
+        # Observations are along the last axis of the photosphere arrays, any
+        # leading axes are walkers; SEDs get an extra axis of N_PTS samples.
+        zp1 = 1.0 + np.asarray(kwargs['redshift'], dtype=float)
+        rest_freqs = self._obs_frequencies * zp1.reshape(zp1.shape + (1, 1))
+        radius_phot = self._radius_phot[..., None]
+        temperature_phot = self._temperature_phot[..., None]
+
+        seds = ne.evaluate('fc * radius_phot**2 * rest_freqs**3 / '
+                           '(exp(xc * rest_freqs / temperature_phot) - 1.0)')
+
+        seds = np.nan_to_num(seds)
 
         seds = self.add_to_existing_seds(seds, **kwargs)
 
@@ -1,7 +1,6 @@
 import numpy as np
 from mosfit.modules.seds.sed import SED
 
-from extinction import apply as eapp
 from extinction import odonnell94
 
 CLASS_NAME = 'Extinction'
@@ -12,48 +11,87 @@ class Extinction(SED):
     """
 
     MW_RV = 3.1
+    NH_PER_AV = 1.8e21
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._preprocessed = False
+        self._batchable = True
+        self._bands = None
+        self._mw_key = None
+        self._host_key = None
 
     def process(self, **kwargs):
-        self.preprocess(**kwargs)
-        self._seds = kwargs['seds']
-        self._nh_host = kwargs['nhhost']
-
-        av_host = self._nh_host / 1.8e21
-
-        for si, cur_band in enumerate(self._bands):
-            bi = self._band_indices[si]
-            # First extinct out LOS dust from MW
-            eapp(self._mw_extinct[si], self._seds[si], inplace=True)
-            # Then extinct out host gal (using rest wavelengths)
-            eapp(
-                odonnell94(self._band_rest_wavelengths[bi], av_host,
-                           self.MW_RV),
-                self._seds[si],
-                inplace=True)
+        # Without SEDs (blackbody lookup mode) extinction is folded into the
+        # tabulated band fluxes of the filters module.
+        if kwargs['seds'] is None:
+            return {'samplewavelengths': self._sample_wavelengths,
+                    'seds': None}
+        self._bands = kwargs['all_bands']
+        self.set_sample_rows(self._bands)
+        self._nh_host = np.asarray(kwargs['nhhost'], dtype=float)
+        redshift = np.asarray(kwargs['redshift'], dtype=float)
+        ebv = np.asarray(kwargs['ebv'], dtype=float)
+
+        # Extinction in magnitudes is linear in A_V, the curves are computed
+        # for unit A_V (host) or the current E(B-V) (MW) and scaled.
+        if redshift.ndim or ebv.ndim:
+            shape = np.broadcast(self._nh_host, redshift, ebv).shape
+            curves = [
+                self.extinction_curves(z, e)
+                for z, e in zip(
+                    np.broadcast_to(redshift, shape),
+                    np.broadcast_to(ebv, shape))
+            ]
+            mw_curves = np.array([x[0] for x in curves])
+            host_curves = np.array([x[1] for x in curves])
+        else:
+            mw_curves, host_curves = self.extinction_curves(
+                float(redshift), float(ebv))
+        av_host = (self._nh_host / self.NH_PER_AV)[..., None, None]
+
+        # A new array is returned, the input SEDs may be reused by the module
+        # that produced them.
+        self._seds = np.asarray(kwargs['seds'], dtype=float) * 10.0**(
+            -0.4 * (mw_curves + av_host * host_curves))
 
         return {'samplewavelengths': self._sample_wavelengths,
                 'seds': self._seds}
 
-    def preprocess(self, **kwargs):
-        if not self._preprocessed:
-            zp1 = 1.0 + kwargs['redshift']
-            self._ebv = kwargs['ebv']
-            self._bands = kwargs['all_bands']
-            self._band_indices = list(
-                map(self._filters.find_band_index, self._bands))
-            self._band_rest_wavelengths = np.array(
-                [[y / zp1 for y in x] for x in self._sample_wavelengths])
-            self._av_mw = self.MW_RV * self._ebv
-            self._mw_extinct = []
-            for si, cur_band in enumerate(self._bands):
-                bi = self._filters.find_band_index(cur_band)
-                # First extinct out LOS dust from MW
-                self._mw_extinct.append(
-                    odonnell94(
-                        np.array(self._sample_wavelengths[bi]), self._av_mw,
-                        self.MW_RV))
-        self._preprocessed = True
+    def extinction_curves(self, redshift, ebv):
+        """Return the MW extinction and the unit A_V host extinction (in
+        magnitudes) at the sample wavelengths of each observation, as
+        (n_obs, N_PTS) arrays. Curves are recomputed only when the redshift,
+        E(B-V), or the observed bands change.
+        """
+        # Keys hold the band indices themselves, their ids may be reused once
+        # the filters module drops them.
+        if not self.same_key(self._mw_key, ebv):
+            self._mw_key = (ebv, self._band_indices)
+            av_mw = self.MW_RV * ebv
+            self._mw_curves = self.band_curves(
+                lambda wavs: odonnell94(wavs, av_mw, self.MW_RV))
+        if not self.same_key(self._host_key, redshift):
+            self._host_key = (redshift, self._band_indices)
+            zp1 = 1.0 + redshift
+            # Host extinction uses the rest wavelengths.
+            self._host_curves = self.band_curves(
+                lambda wavs: odonnell94(wavs / zp1, 1.0, self.MW_RV))
+        return self._mw_curves, self._host_curves
+
+    def same_key(self, key, value):
+        """Return whether curves cached under `key` are for `value` and the
+        current band indices.
+        """
+        return (key is not None and key[0] == value and
+                key[1] is self._band_indices)
+
+    def band_curves(self, curve):
+        """Evaluate `curve` once per unique band and spread the results over
+        the observations.
+        """
+        bands, rows = np.unique(self._band_indices, return_inverse=True)
+        curves = np.array([
+            curve(np.array(self._sample_wavelengths[bi], dtype=float))
+            for bi in bands
+        ]).reshape(len(bands), self.N_PTS)
+        return curves[rows]
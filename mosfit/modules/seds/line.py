@@ -1,3 +1,4 @@
+import numpy as np
 from mosfit.modules.seds.sed import SED
 
 CLASS_NAME = 'Line'
@@ -14,17 +15,11 @@ class Line(SED):
         self._seds = kwargs['seds']
         self._sample_wavelengths = kwargs['samplewavelengths']
         self._luminosities = kwargs['luminosities']
-        zp1 = 1.0 + kwargs['redshift']
+        self._bands = kwargs['all_bands']
+        self.set_sample_rows(self._bands)
 
-        seds = []
-        for li, lum in enumerate(self._luminosities):
-            cur_band = self._bands[li]
-            bi = self._filters.find_band_index(cur_band)
-            rest_freqs = [x * zp1 for x in self._sample_frequencies[bi]]
-
-            # Dummy function for now, needs implementation
-            sed = [0.0 for x in rest_freqs]
-            seds.append(list(sed))
+        # Dummy function for now, needs implementation
+        seds = np.zeros(np.shape(self._luminosities) + (self.N_PTS, ))
 
         seds = self.add_to_existing_seds(seds, **kwargs)
 
@@ -17,6 +17,7 @@ class SED(Module):
         super().__init__(**kwargs)
         self._sample_wavelengths = []
         self._filters = []
+        self._band_indices = None
 
     def handle_requests(self, **requests):
         self._filters = requests.get('filters', [])
@@ -25,17 +26,35 @@ class SED(Module):
             wave_ranges = requests.get('band_wave_ranges', [])
             if not wave_ranges:
                 return
+            # Bands whose filters were not loaded have no range.
             for rng in wave_ranges:
                 self._sample_wavelengths.append(
-                    list(np.linspace(rng[0], rng[1], self.N_PTS)))
+                    list(np.linspace(rng[0], rng[1], self.N_PTS))
+                    if rng else [])
         self._sample_frequencies = [[self.C_CONST / x for x in y]
                                     for y in self._sample_wavelengths]
+        self._band_indices = None
+
+    def set_sample_rows(self, bands):
+        """Stack the sample wavelengths and frequencies of the band of each
+        observation into (n_obs, N_PTS) arrays, rebuilt only when the band
+        indices change.
+        """
+        band_indices = self._filters.find_band_indices(bands)
+        if band_indices is self._band_indices:
+            return
+        self._band_indices = band_indices
+        self._obs_wavelengths = np.array(
+            [self._sample_wavelengths[bi] for bi in band_indices],
+            dtype=float).reshape(len(band_indices), self.N_PTS)
+        self._obs_frequencies = np.array(
+            [self._sample_frequencies[bi] for bi in band_indices],
+            dtype=float).reshape(len(band_indices), self.N_PTS)
 
     def add_to_existing_seds(self, new_seds, **kwargs):
         old_seds = kwargs.get('seds', None)
         if old_seds is not None:
-            new_seds = [(i + j for i, j in zip(x, y))
-                        for x, y in zip(old_seds, list(new_seds))]
+            new_seds = np.asarray(old_seds) + new_seds
         return new_seds
 
     def request(self, request):
@@ -2,6 +2,7 @@ import numexpr as ne
 import numpy as np
 from mosfit.constants import C_CGS, FOUR_PI, KM_CGS, M_SUN_CGS, DAY_CGS
 from mosfit.modules.transforms.transform import Transform
+from mosfit.utils import trapezoid
 
 CLASS_NAME = 'DiffusionCSM'
 
@@ -15,6 +16,10 @@ class DiffusionCSM(Transform):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # 'cumulative' convolves the piecewise linear input luminosity with
+        # the kernel exactly in one sweep over the dense times, 'quadrature'
+        # integrates numerically up to each observation time.
+        self._method = kwargs.get('method', 'cumulative')
 
     def process(self, **kwargs):
         self.set_times_lums(**kwargs)
@@ -30,7 +35,10 @@ class DiffusionCSM(Transform):
                         **(1.0 / (1.0 - self._s))) # radius of photosphere (should be within CSM)
         self._tau_diff = (self._kappa * self._mass) / (13.8 * C_CGS * self._Rph) / DAY_CGS
 
-        tbarg = self.MIN_EXP_ARG * self._tau_diff**2
+        if self._method == 'cumulative':
+            return {'luminosities': self.cumulative_luminosities()}
+
+        tbspan = self.MIN_EXP_ARG * self._tau_diff
         new_lum = []
         evaled = False
         lum_cache = {}
@@ -42,8 +50,7 @@ class DiffusionCSM(Transform):
             if te in lum_cache:
                 new_lum.append(lum_cache[te])
                 continue
-            te2 = te**2
-            tb = max(np.sqrt(max(te2 - tbarg, 0.0)), min_te)
+            tb = max(te - tbspan, min_te)
             int_times = np.linspace(tb, te, self.N_INT_TIMES)
             dt = int_times[1] - int_times[0]
             td = self._tau_diff
@@ -59,7 +66,40 @@ class DiffusionCSM(Transform):
                 int_arg = ne.re_evaluate()
 
             int_arg[np.isnan(int_arg)] = 0.0
-            lum_val = np.trapz(int_arg, dx=dt)
+            lum_val = trapezoid(int_arg, dx=dt)
             lum_cache[te] = lum_val
             new_lum.append(lum_val)
         return {'luminosities': new_lum}
+
+    def cumulative_luminosities(self):
+        """Compute the diffused luminosities at all observation times in one
+        sweep over the dense times.
+
+        The convolution J(t) of L(t') t' / td^2 with the kernel
+        exp((t' - t) / td) obeys J(t1) = exp(-(t1 - t0) / td) J(t0) plus the
+        integral over [t0, t1], which has a closed form for a piecewise
+        linear L(t).
+        """
+        td = self._tau_diff
+        tes = np.asarray(self._times_since_exp, dtype=float)
+
+        # The integral starts at the explosion or the first dense time.
+        tb = max(0.0, self._dense_times_since_exp[0])
+        times, lums, ki = self.integration_grid(tb)
+        slopes = np.diff(lums) / np.diff(times)
+        cum = self.decayed_cumsum(
+            self.interval_integrals(times[:-1], times[1:], lums[:-1], slopes),
+            times / td)
+
+        # Observation times are dense times, the integral up to each is
+        # gathered from the cumulative sum.
+        return np.where(tes > tb, cum[ki], 0.0)
+
+    def interval_integrals(self, t0, t1, l0, slope):
+        """Return the integrals of L(t) t / td^2 exp((t - t1) / td) from `t0`
+        to `t1` for L(t) = l0 + slope * (t - t0).
+        """
+        td = self._tau_diff
+        h = t1 - t0
+        return (h / td * (l0 + slope * (t1 - 2.0 * td)) - np.expm1(-h / td) *
+                (l0 * (t0 - td) - slope * td * (t0 - 2.0 * td)) / td)
@@ -1,3 +1,4 @@
+import numpy as np
 from mosfit.modules.module import Module
 
 CLASS_NAME = 'Transform'
@@ -7,6 +8,10 @@ class Transform(Module):
     """Parent class for transforms.
     """
 
+    # Largest range of exponents summed over with a common scale factor in
+    # `decayed_cumsum`.
+    MAX_EXP_RANGE = 600.0
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -19,10 +24,88 @@ class Transform(Module):
         if 'dense_times' in kwargs:
             self._dense_times = kwargs['dense_times']
             self._dense_luminosities = kwargs['luminosities']
+            self._dense_indices = kwargs['dense_indices']
         elif min(self._times) > self._rest_t_explosion:
-            self._dense_times = [self._rest_t_explosion] + self._times
-            self._dense_luminosities = [0.0] + kwargs['luminosities']
-        self._times_since_exp = [(x - self._rest_t_explosion)
-                                 for x in self._times]
-        self._dense_times_since_exp = [(x - self._rest_t_explosion)
-                                       for x in self._dense_times]
+            self._dense_times = [self._rest_t_explosion] + list(self._times)
+            self._dense_luminosities = [0.0] + list(kwargs['luminosities'])
+            self._dense_indices = np.arange(1, len(self._times) + 1)
+        self._times_since_exp = np.asarray(
+            self._times, dtype=float) - self.per_time(self._rest_t_explosion)
+        self._dense_times_since_exp = np.asarray(
+            self._dense_times, dtype=float) - self.per_time(
+                self._rest_t_explosion)
+
+    def integration_grid(self, tb):
+        """Return the dense times since explosion from `tb` onward, the
+        luminosities at those times (interpolating the luminosity at `tb`),
+        and the position in the grid of each observation time (the position of
+        `tb` for observations before it).
+        """
+        times = np.asarray(self._dense_times_since_exp, dtype=float)
+        lums = np.asarray(self._dense_luminosities, dtype=float)
+        keep = times > tb
+        grid = np.concatenate(([tb], times[keep]))
+        lums = np.concatenate(([np.interp(tb, self._dense_times_since_exp,
+                                          self._dense_luminosities)],
+                               lums[keep]))
+        # Dense times can coincide once shifted to the explosion time.
+        grid, unique, inverse = np.unique(
+            grid, return_index=True, return_inverse=True)
+        positions = np.full(len(times), inverse[0])
+        positions[keep] = inverse[1:]
+        return grid, lums[unique], positions[self._dense_indices]
+
+    def clamped_grid(self, tb):
+        """Return the dense times since explosion and the luminosities at
+        those times, with the times before `tb` moved up to `tb` and given
+        the luminosity interpolated there. Unlike `integration_grid`, the
+        grid keeps its shape, so that it lines up for a batch of walkers (with
+        a leading walker axis and one `tb` per walker). Intervals of zero
+        length are left in.
+        """
+        times = self._dense_times_since_exp
+        lums = np.broadcast_to(
+            np.asarray(self._dense_luminosities, dtype=float), times.shape)
+        tb = np.asarray(tb, dtype=float)[..., None]
+        below = times <= tb
+        k = np.sum(below, axis=-1, keepdims=True)
+        k0 = np.maximum(k - 1, 0)
+        k1 = np.minimum(k, times.shape[-1] - 1)
+        t0 = np.take_along_axis(times, k0, axis=-1)
+        t1 = np.take_along_axis(times, k1, axis=-1)
+        l0 = np.take_along_axis(lums, k0, axis=-1)
+        l1 = np.take_along_axis(lums, k1, axis=-1)
+        # Interpolated as by `np.interp`.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ltb = np.where(t1 > t0, (l1 - l0) / (t1 - t0) * (tb - t0) + l0,
+                           l0)
+        return np.where(below, tb, times), np.where(below, ltb, lums)
+
+    def decayed_cumsum(self, steps, exps):
+        """Return J[k] = sum over j < k of steps[j] * exp(exps[j + 1] -
+        exps[k]) for increasing `exps`. The sum is taken in blocks small
+        enough to share one scale factor, so that no exponential overflows.
+        With a leading walker axis, where every walker would need blocks of
+        its own, J is accumulated one term at a time for all walkers at once.
+        """
+        if np.ndim(exps) > 1:
+            decays = np.exp(exps[:, :-1] - exps[:, 1:]).T
+            steps = np.ascontiguousarray(steps.T)
+            cum = np.zeros(exps.shape[::-1])
+            for k in range(1, len(cum)):
+                np.multiply(cum[k - 1], decays[k - 1], out=cum[k])
+                cum[k] += steps[k - 1]
+            return cum.T
+        cum = np.zeros(len(exps))
+        k0 = 0
+        while k0 < len(exps) - 1:
+            k1 = max(
+                np.searchsorted(
+                    exps, exps[k0] + self.MAX_EXP_RANGE, side='right') - 1,
+                k0 + 1)
+            ref = exps[k1]
+            block = np.cumsum(steps[k0:k1] * np.exp(exps[k0 + 1:k1 + 1] - ref))
+            cum[k0 + 1:k1 + 1] = np.exp(exps[k0] - exps[k0 + 1:k1 + 1]) * (
+                cum[k0]) + block * np.exp(ref - exps[k0 + 1:k1 + 1])
+            k0 = k1
+        return cum
@@ -0,0 +1,110 @@
+"""Timing and call-count instrumentation for model evaluations.
+"""
+from collections import OrderedDict
+from math import log10
+from time import perf_counter
+
+import numpy as np
+
+
+class Profiler(object):
+    """Collect call counts and wall times of named sections of code.
+    """
+
+    # Durations are binned logarithmically (20 bins per decade from 10 ns to
+    # 1000 s) so that percentiles can be estimated without storing every
+    # call.
+    BINS_PER_DECADE = 20
+    MIN_LOG_TIME = -8.0
+    NUM_BINS = 220
+
+    def __init__(self):
+        self._sections = OrderedDict()
+        self._evaluations = 0
+
+    def wrap(self, name, func):
+        """Return `func` wrapped such that every call is timed under `name`.
+        """
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, perf_counter() - start)
+
+        return timed
+
+    def add(self, name, duration):
+        """Record a single call of section `name` that took `duration`
+        seconds.
+        """
+        section = self._sections.get(name)
+        if section is None:
+            section = [0, 0.0, [0] * self.NUM_BINS]
+            self._sections[name] = section
+        section[0] += 1
+        section[1] += duration
+        b = int((log10(max(duration, 1.0e-8)) - self.MIN_LOG_TIME) *
+                self.BINS_PER_DECADE)
+        section[2][min(b, self.NUM_BINS - 1)] += 1
+
+    def tally(self, evaluations=1):
+        """Count likelihood evaluations, used to normalize call counts.
+        """
+        self._evaluations += evaluations
+
+    def evaluations(self):
+        return self._evaluations
+
+    def calls(self, name):
+        return self._sections[name][0] if name in self._sections else 0
+
+    def total(self, name):
+        return self._sections[name][1] if name in self._sections else 0.0
+
+    def percentile(self, name, q):
+        """Estimate the `q`th percentile of the call durations of section
+        `name` from its histogram.
+        """
+        count, total, hist = self._sections[name]
+        cum = np.cumsum(hist)
+        b = int(np.searchsorted(cum, q / 100.0 * count))
+        return 10.0**(self.MIN_LOG_TIME + (b + 0.5) / self.BINS_PER_DECADE)
+
+    def report(self, phases=OrderedDict(), title='', notes=[]):
+        """Return a plain text report of the time spent in each section,
+        sorted by total time, preceded by the fraction of the wall time spent
+        in each of the given `phases`.
+        """
+        lines = []
+        if title:
+            lines.append(title)
+        wall = sum(phases.values())
+        if wall > 0.0:
+            lines.append('Wall time: {:.3f} s ('.format(wall) + ', '.join([
+                '{} {:.1f}%'.format(x, 100.0 * phases[x] / wall)
+                for x in phases
+            ]) + ')')
+        lines.append('Likelihood evaluations: {}'.format(self._evaluations))
+        lines.extend(notes)
+        lines.append('')
+
+        header = ('{:<28} {:>10} {:>10} {:>11} {:>10} {:>10} {:>10} '
+                  '{:>10}').format('Section', 'Calls', 'Calls/eval',
+                                   'Total (s)', 'Mean (ms)', 'p50 (ms)',
+                                   'p90 (ms)', 'p99 (ms)')
+        lines.append(header)
+        lines.append('-' * len(header))
+        evals = max(self._evaluations, 1)
+        for name in sorted(
+                self._sections, key=lambda x: -self._sections[x][1]):
+            count, total, hist = self._sections[name]
+            lines.append(('{:<28} {:>10d} {:>10.3f} {:>11.3f} {:>10.4f} '
+                          '{:>10.4f} {:>10.4f} {:>10.4f}').format(
+                              name, count, count / evals, total,
+                              1000.0 * total / count,
+                              1000.0 * self.percentile(name, 50),
+                              1000.0 * self.percentile(name, 90),
+                              1000.0 * self.percentile(name, 99)))
+        return '\n'.join(lines) + '\n'
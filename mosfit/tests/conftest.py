@@ -0,0 +1,27 @@
+"""Fixtures shared by the tests.
+"""
+import os
+import shutil
+
+import pytest
+
+from mosfit.modules.observables.filters import Filters
+from mosfit.modules.parameters.redshift import Redshift
+
+
+@pytest.fixture(scope='session', autouse=True)
+def filter_dir(tmp_path_factory):
+    """Read filters from a copy of the filter directory, as reading a filter
+    rewrites its curve, and keep the caches out of the source tree.
+    """
+    dir_path = str(tmp_path_factory.mktemp('observables'))
+    shutil.copytree(os.path.join(Filters.DIR_PATH, 'filters'),
+                    os.path.join(dir_path, 'filters'))
+    shutil.copy(os.path.join(Filters.DIR_PATH, 'filterrules.json'), dir_path)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(Filters, 'DIR_PATH', dir_path)
+        mp.setattr(Filters, 'CACHE_PATH',
+                   os.path.join(dir_path, 'filters.npz'))
+        mp.setattr(Redshift, 'CACHE_PATH',
+                   os.path.join(dir_path, 'redshifts.npz'))
+        yield dir_path
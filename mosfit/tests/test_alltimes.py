@@ -0,0 +1,32 @@
+"""Tests of the merged observation arrays.
+"""
+import numpy as np
+
+from mosfit.modules.arrays.alltimes import AllTimes
+
+
+def columns():
+    return dict(times=[3.0, 1.0, 2.0], systems=['', '', 'AB'],
+                instruments=['', '', ''], bandsets=['', '', ''],
+                bands=['V', 'B', 'g'], extra_times=[1.5], extra_systems=[''],
+                extra_instruments=[''], extra_bandsets=[''], extra_bands=['B'])
+
+
+def test_outputs():
+    outputs = AllTimes(name='alltimes', pool=None).process(**columns())
+    assert np.array_equal(outputs['all_times'], [1.0, 1.5, 2.0, 3.0])
+    assert list(outputs['all_bands']) == ['B', 'B', 'g', 'V']
+    assert list(outputs['observed']) == [True, False, True, True]
+    assert not outputs['all_times'].flags.writeable
+
+
+def test_cache():
+    alltimes = AllTimes(name='alltimes', pool=None)
+    kwargs = columns()
+    outputs = alltimes.process(**kwargs)
+    assert alltimes.process(**kwargs)['all_times'] is outputs['all_times']
+    # Fresh lists every call do not grow the cache.
+    for i in range(20):
+        assert np.array_equal(
+            alltimes.process(**columns())['all_times'], outputs['all_times'])
+    assert len(alltimes._cache) == AllTimes.CACHE_SIZE
@@ -0,0 +1,68 @@
+"""Tests of the Arnett diffusion transform.
+"""
+import numpy as np
+from scipy.integrate import quad
+
+from mosfit.modules.transforms.diffusion import Diffusion
+
+KAPPA = 0.2
+KAPPA_GAMMA = 10.0
+V_EJECTA = 1.0e4
+
+
+def diffuse(mejecta, method='cumulative'):
+    """Diffuse a nickel-like input luminosity with the given ejecta mass,
+    returning the transform and its output luminosities.
+    """
+    diffusion = Diffusion(name='diffusion', pool=None, method=method)
+    rest_times = np.array([0.3, 1.0, 2.5, 7.0, 15.0, 40.0, 90.0])
+    dense_times = np.unique(np.concatenate(
+        (np.logspace(-3, 2, 100), rest_times, [0.0])))
+    lums = 1.0e43 * (np.exp(-dense_times / 8.8) +
+                     0.2 * np.exp(-dense_times / 111.3))
+    outputs = diffusion.process(
+        rest_times=rest_times, resttexplosion=0.0, dense_times=dense_times,
+        dense_indices=np.searchsorted(dense_times, rest_times),
+        luminosities=lums, kappa=KAPPA, kappagamma=KAPPA_GAMMA,
+        mejecta=mejecta, vejecta=V_EJECTA)
+    return diffusion, np.asarray(outputs['luminosities'], dtype=float)
+
+
+def quadrature(diffusion):
+    """Integrate the Arnett kernel over the piecewise linear input
+    luminosity with adaptive quadrature, one dense interval at a time. The
+    kernel is normalized at the end of each interval, where it peaks, and
+    only integrated where it exceeds exp(-100) of its peak.
+    """
+    td = diffusion._tau_diff
+    times = diffusion._dense_times_since_exp
+    lums = diffusion._dense_luminosities
+    new_lums = []
+    for te in diffusion._times_since_exp:
+        edges = np.concatenate(([0.0], times[(times > 0.0) & (times < te)],
+                                [te]))
+        total = 0.0
+        for t0, t1 in zip(edges[:-1], edges[1:]):
+            t0 = max(t0, t1 - 50.0 * td**2 / t1)
+            total += np.exp((t1**2 - te**2) / td**2) * quad(
+                lambda t: 2.0 * np.interp(t, times, lums) * t / td**2 *
+                np.exp((t - t1) * (t + t1) / td**2), t0, t1,
+                epsabs=0.0, epsrel=1.0e-12, limit=200)[0]
+        new_lums.append(total * -np.expm1(-diffusion._trap_coeff / te**2))
+    return np.array(new_lums)
+
+
+def test_cumulative_matches_quadrature():
+    # Diffusion times from twenty minutes to three months.
+    for mejecta in [1.0e-6, 1.0e-4, 1.0e-2, 1.0, 30.0]:
+        diffusion, lums = diffuse(mejecta)
+        assert np.allclose(lums, quadrature(diffusion), rtol=1.0e-8,
+                           atol=0.0)
+
+
+def test_quadrature_method():
+    diffusion, lums = diffuse(1.0)
+    assert diffusion._tau_diff > 1.0
+    qdiffusion, qlums = diffuse(1.0, method='quadrature')
+    assert np.all(np.isfinite(qlums))
+    assert np.allclose(qlums, lums, rtol=1.0e-3, atol=0.0)
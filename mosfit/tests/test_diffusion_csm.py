@@ -0,0 +1,89 @@
+"""Tests of the CSM diffusion transform.
+"""
+from math import factorial
+
+import numpy as np
+from scipy.integrate import quad
+
+from mosfit.modules.transforms.diffusion_csm import DiffusionCSM
+
+REST_TIMES = np.array([0.3, 1.0, 2.5, 7.0, 15.0, 40.0, 90.0, 300.0])
+
+
+def diffuse(lum_func, mcsm, rho, s=0.0, method='cumulative'):
+    """Diffuse the input luminosity `lum_func` of the times since explosion
+    through a CSM shell, returning the transform and its output
+    luminosities.
+    """
+    diffusion = DiffusionCSM(name='diffusion', pool=None, method=method)
+    dense_times = np.unique(np.concatenate(
+        (np.logspace(-3, 2.5, 100), REST_TIMES, [0.0])))
+    outputs = diffusion.process(
+        rest_times=REST_TIMES, resttexplosion=0.0, dense_times=dense_times,
+        dense_indices=np.searchsorted(dense_times, REST_TIMES),
+        luminosities=lum_func(dense_times), kappa=0.34, mcsm=mcsm, r0=6.685,
+        s=s, rho=rho)
+    return diffusion, np.asarray(outputs['luminosities'], dtype=float)
+
+
+def quadrature(diffusion):
+    """Convolve the piecewise linear input luminosity with the kernel using
+    adaptive quadrature, one dense interval at a time.
+    """
+    td = diffusion._tau_diff
+    times = diffusion._dense_times_since_exp
+    lums = diffusion._dense_luminosities
+    new_lums = []
+    for te in diffusion._times_since_exp:
+        edges = np.concatenate(([0.0], times[(times > 0.0) & (times < te)],
+                                [te]))
+        new_lums.append(sum([
+            quad(lambda t: np.interp(t, times, lums) * t / td**2 *
+                 np.exp((t - te) / td), t0, t1, epsabs=0.0,
+                 epsrel=1.0e-12)[0] for t0, t1 in zip(edges[:-1], edges[1:])
+        ]))
+    return np.array(new_lums)
+
+
+def test_cumulative_matches_quadrature():
+    # Diffusion times from one day to five hundred days.
+    for mcsm, rho, s in [(0.1, 1.0e-15, 0.0), (1.0, 1.0e-13, 0.0),
+                         (30.0, 1.0e-11, 0.0), (1.0, 1.0e-13, 2.0)]:
+        diffusion, lums = diffuse(
+            lambda t: 1.0e43 * np.exp(-t / 30.0) * t / (1.0 + t), mcsm, rho,
+            s)
+        assert np.allclose(lums, quadrature(diffusion), rtol=1.0e-10,
+                           atol=0.0)
+
+
+def exp_tail(x, n):
+    """Return exp(-x) minus its Taylor polynomial of degree n - 1, summing
+    the series for small `x` to avoid cancellation.
+    """
+    terms = [(-x)**k / factorial(k) for k in range(n)]
+    series = sum([(-x)**k / factorial(k) for k in range(n, n + 30)])
+    return np.where(x < 1.0, series, np.exp(-x) - sum(terms))
+
+
+def test_constant_input():
+    diffusion, lums = diffuse(lambda t: np.full(len(t), 2.0e42), 1.0, 1.0e-13)
+    x = REST_TIMES / diffusion._tau_diff
+    assert np.allclose(lums, 2.0e42 * exp_tail(x, 2), rtol=1.0e-12, atol=0.0)
+
+
+def test_linear_input():
+    diffusion, lums = diffuse(lambda t: 3.0e40 * t, 1.0, 1.0e-13)
+    td = diffusion._tau_diff
+    x = REST_TIMES / td
+    assert np.allclose(lums, -2.0 * 3.0e40 * td * exp_tail(x, 3),
+                       rtol=1.0e-12, atol=0.0)
+
+
+def test_quadrature_method():
+    # The quadrature covers the kernel up to late times.
+    for mcsm, rho in [(0.1, 1.0e-15), (1.0, 1.0e-13)]:
+        diffusion, lums = diffuse(lambda t: np.full(len(t), 2.0e42), mcsm,
+                                  rho, method='quadrature')
+        x = REST_TIMES / diffusion._tau_diff
+        assert np.allclose(lums, 2.0e42 * exp_tail(x, 2), rtol=1.0e-2,
+                           atol=0.0)
@@ -0,0 +1,48 @@
+"""Tests of the engines.
+"""
+import numpy as np
+
+from mosfit.modules.engines.magnetar import Magnetar
+from mosfit.modules.engines.nickelcobalt import NickelCobalt
+
+DENSE_TIMES = np.concatenate(([-3.0], np.logspace(-2, 2.5, 50)))
+
+
+def nickelcobalt(mejecta=2.0):
+    return NickelCobalt(name='nickelcobalt', pool=None).process(
+        dense_times=DENSE_TIMES, resttexplosion=0.0, fnickel=0.3,
+        mejecta=mejecta)
+
+
+def magnetar(Pspin=3.0, **kwargs):
+    return Magnetar(name='magnetar', pool=None).process(
+        dense_times=DENSE_TIMES, resttexplosion=0.0, Pspin=Pspin, Bfield=1.5,
+        Mns=1.6, thetaPB=1.0, **kwargs)
+
+
+def test_engines_sum():
+    nickel = nickelcobalt()['luminosities']
+    alone = magnetar()['luminosities']
+    nickel_copy = nickel.copy()
+    both = magnetar(luminosities=nickel)['luminosities']
+    assert np.all(nickel[0] == 0.0) and np.all(alone[0] == 0.0)
+    assert np.all(nickel[1:] > 0.0) and np.all(alone[1:] > 0.0)
+    assert np.array_equal(both, alone + nickel)
+    # The luminosities of the preceding engine are not modified.
+    assert np.array_equal(nickel, nickel_copy)
+
+
+def test_engines_sum_walkers():
+    mejecta = np.array([1.0, 2.0, 5.0])
+    pspin = np.array([2.0, 3.0, 8.0])
+    nickel = nickelcobalt(mejecta=mejecta)['luminosities']
+    alone = magnetar(Pspin=pspin)['luminosities']
+    both = magnetar(Pspin=pspin, luminosities=nickel)['luminosities']
+    assert both.shape == (len(pspin), len(DENSE_TIMES))
+    assert np.array_equal(both, alone + nickel)
+    for wi in range(len(pspin)):
+        assert np.allclose(
+            both[wi],
+            magnetar(Pspin=pspin[wi], luminosities=nickelcobalt(
+                mejecta=mejecta[wi])['luminosities'])['luminosities'],
+            rtol=1.0e-14, atol=0.0)
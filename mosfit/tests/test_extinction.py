@@ -0,0 +1,96 @@
+"""Tests of the extinction SED.
+"""
+import numpy as np
+from extinction import odonnell94
+from schwimmbad import SerialPool
+
+from mosfit.modules.observables.filters import Filters
+from mosfit.modules.seds.extinction import Extinction
+
+OBS_BANDS = np.array(['Ks', 'U', 'J', 'B', 'V', 'U'])
+
+
+def load_extinction():
+    filters = Filters(name='filters', pool=SerialPool())
+    filters.load_bands([(x, '', '', '') for x in set(OBS_BANDS)])
+    extinction = Extinction(name='extinction', pool=None)
+    extinction.handle_requests(
+        filters=filters, band_wave_ranges=filters.request('band_wave_ranges'))
+    wavelengths = np.array([
+        extinction._sample_wavelengths[x]
+        for x in filters.find_band_indices(OBS_BANDS)
+    ])
+    return extinction, wavelengths
+
+
+def expected_seds(seds, wavelengths, nhhost, redshift, ebv):
+    """Return `seds` dimmed by MW and host extinction, one observation at a
+    time.
+    """
+    av_host = nhhost / Extinction.NH_PER_AV
+    return np.array([
+        sed * 10.0**(-0.4 * (
+            odonnell94(wavs, Extinction.MW_RV * ebv, Extinction.MW_RV) +
+            odonnell94(wavs / (1.0 + redshift), av_host, Extinction.MW_RV)))
+        for sed, wavs in zip(seds, wavelengths)
+    ])
+
+
+def test_extinction():
+    extinction, wavelengths = load_extinction()
+    rng = np.random.RandomState(0)
+    seds = rng.uniform(1.0e25, 1.0e27, size=wavelengths.shape)
+    seds_copy = seds.copy()
+    for nhhost, redshift, ebv in [(1.0e21, 0.01, 0.0), (0.0, 0.5, 0.2),
+                                  (5.0e21, 0.1, 0.05)]:
+        new_seds = extinction.process(
+            seds=seds, all_bands=OBS_BANDS, nhhost=nhhost, redshift=redshift,
+            ebv=ebv)['seds']
+        assert np.all(new_seds < seds)
+        assert np.allclose(
+            new_seds, expected_seds(seds, wavelengths, nhhost, redshift, ebv),
+            rtol=1.0e-12, atol=0.0)
+    # No extinction leaves SEDs unchanged, and the input is not modified.
+    assert np.array_equal(
+        extinction.process(seds=seds, all_bands=OBS_BANDS, nhhost=0.0,
+                           redshift=0.1, ebv=0.0)['seds'], seds)
+    assert np.array_equal(seds, seds_copy)
+
+
+def test_extinction_walkers():
+    extinction, wavelengths = load_extinction()
+    rng = np.random.RandomState(1)
+    seds = rng.uniform(1.0e25, 1.0e27, size=(3, ) + wavelengths.shape)
+    nhhost = np.array([1.0e20, 2.0e21, 8.0e21])
+    redshift = np.array([0.01, 0.2, 1.0])
+    ebv = np.array([0.0, 0.1, 0.3])
+    new_seds = extinction.process(
+        seds=seds, all_bands=OBS_BANDS, nhhost=nhhost, redshift=redshift,
+        ebv=ebv)['seds']
+    for wi in range(len(seds)):
+        assert np.allclose(
+            new_seds[wi], expected_seds(seds[wi], wavelengths, nhhost[wi],
+                                        redshift[wi], ebv[wi]),
+            rtol=1.0e-12, atol=0.0)
+
+
+def test_extinction_band_changes():
+    extinction, wavelengths = load_extinction()
+    filters = extinction._filters
+    filters.BAND_INDICES_CACHE_SIZE = 1
+    rng = np.random.RandomState(2)
+    # Observation lists of the same length whose band indices replace each
+    # other in the filters cache.
+    lists = [OBS_BANDS, OBS_BANDS[::-1], np.roll(OBS_BANDS, 1)]
+    for i in range(30):
+        bands = np.array(lists[i % len(lists)])
+        wavs = np.array([
+            extinction._sample_wavelengths[x]
+            for x in filters.find_band_indices(bands)
+        ])
+        seds = rng.uniform(1.0e25, 1.0e27, size=wavs.shape)
+        new_seds = extinction.process(
+            seds=seds, all_bands=bands, nhhost=1.0e21, redshift=0.1,
+            ebv=0.05)['seds']
+        assert np.allclose(new_seds, expected_seds(
+            seds, wavs, 1.0e21, 0.1, 0.05), rtol=1.0e-12, atol=0.0)
@@ -0,0 +1,233 @@
+"""Tests of the band-pass filters.
+"""
+import os
+import shutil
+
+import numpy as np
+from astropy.io.votable import parse as voparse
+from schwimmbad import SerialPool
+
+from mosfit.constants import FOUR_PI, MPC_CGS
+from mosfit.modules.observables import filters as filters_module
+from mosfit.modules.observables.filters import Filters
+from mosfit.modules.seds.blackbody import blackbody
+from mosfit.modules.seds.extinction import Extinction
+from mosfit.modules.seds.sed import SED
+
+# Bands of the SN2006le data, observations are interleaved so that their
+# order differs from that of the bands.
+BANDS = ['U', 'B', 'V', 'R', 'I', 'J', 'H', 'Ks']
+OBS_BANDS = np.array(['Ks', 'U', 'J', 'B', 'H', 'V', 'I', 'R', 'U', 'Ks'])
+LUM_DIST = 10.0
+
+
+def load_filters():
+    filters = Filters(name='filters', pool=SerialPool())
+    filters.load_bands([(x, '', '', '') for x in BANDS])
+    return filters
+
+
+def sample_wavelengths(filters, n_pts):
+    """Return `n_pts` evenly spaced sample wavelengths over the range of each
+    loaded band, as SEDs request them.
+    """
+    sed = SED(name='sed', pool=None)
+    sed.N_PTS = n_pts
+    sed.handle_requests(
+        filters=filters, band_wave_ranges=filters.request('band_wave_ranges'))
+    return sed._sample_wavelengths
+
+
+def flat_magnitudes(filters, wavelengths, mag):
+    """Return the model magnitudes of a source that is flat in f_nu at AB
+    magnitude `mag`, with the zero point of each band removed.
+    """
+    f_nu = 10.0**(-0.4 * (mag + 48.60))
+    l_nu = f_nu * FOUR_PI * (LUM_DIST * MPC_CGS)**2
+    n_pts = len([x for x in wavelengths if len(x)][0])
+    mags = filters.process(
+        all_bands=OBS_BANDS, samplewavelengths=wavelengths, lumdist=LUM_DIST,
+        luminosities=None, systems=None, instruments=None, bandsets=None,
+        seds=np.full((len(OBS_BANDS), n_pts), l_nu))['model_magnitudes']
+    offsets = np.array(filters._band_offsets)[filters.find_band_indices(
+        OBS_BANDS)]
+    return mags + offsets
+
+
+def test_ab_zero_point():
+    filters = load_filters()
+    for mag in [0.0, 15.0, 25.0]:
+        mags = flat_magnitudes(filters, sample_wavelengths(filters, 4001),
+                               mag)
+        assert np.allclose(mags, mag, rtol=0.0, atol=1.0e-4)
+
+
+def test_ab_zero_point_sed_sampling():
+    # With the default sampling of SEDs, the transmission of the narrow
+    # features of the 2MASS curves is only resolved to a few percent.
+    filters = load_filters()
+    mags = flat_magnitudes(filters, sample_wavelengths(filters, SED.N_PTS),
+                           15.0)
+    assert np.allclose(mags, 15.0, rtol=0.0, atol=0.05)
+
+
+def test_magnitude_scale():
+    # Five magnitudes are a factor of one hundred in flux.
+    filters = load_filters()
+    wavelengths = sample_wavelengths(filters, SED.N_PTS)
+    mags = flat_magnitudes(filters, wavelengths, 15.0)
+    assert np.allclose(flat_magnitudes(filters, wavelengths, 20.0) - mags,
+                       5.0, rtol=0.0, atol=1.0e-10)
+
+
+def test_observation_order():
+    # The magnitude of an observation does not depend upon the bands of the
+    # other observations.
+    filters = load_filters()
+    wavelengths = sample_wavelengths(filters, SED.N_PTS)
+    rng = np.random.RandomState(0)
+    seds = rng.uniform(1.0e25, 1.0e27, size=(len(OBS_BANDS), SED.N_PTS))
+    mags = []
+    for order in [np.arange(len(OBS_BANDS)), rng.permutation(len(OBS_BANDS))]:
+        mags.append(filters.process(
+            all_bands=OBS_BANDS[order], samplewavelengths=wavelengths,
+            lumdist=LUM_DIST, luminosities=None, systems=None,
+            instruments=None, bandsets=None,
+            seds=seds[order])['model_magnitudes'][np.argsort(order)])
+    assert np.allclose(mags[0], mags[1], rtol=0.0, atol=1.0e-12)
+
+
+def test_band_indices_cache():
+    filters = load_filters()
+    bands = list(OBS_BANDS)
+    indices = filters.find_band_indices(bands)
+    assert filters.find_band_indices(bands) is indices
+    # Fresh lists every call do not grow the cache.
+    for i in range(20):
+        assert np.array_equal(filters.find_band_indices(list(OBS_BANDS)),
+                              indices)
+    assert (len(filters._band_indices_cache) ==
+            Filters.BAND_INDICES_CACHE_SIZE)
+    assert np.array_equal(filters.find_band_indices(bands), indices)
+
+
+def test_shared_curve_offsets(tmp_path):
+    # Filters are parsed from a copy, parsing rewrites the curves.
+    dir_path = str(tmp_path / 'observables')
+    source = os.path.dirname(os.path.realpath(filters_module.__file__))
+    shutil.copytree(os.path.join(source, 'filters'),
+                    os.path.join(dir_path, 'filters'))
+    shutil.copy(os.path.join(source, 'filterrules.json'), dir_path)
+    cache_path = str(tmp_path / 'filters.npz')
+
+    def parse(*args):
+        raise AssertionError('Filter parsed instead of read from the cache.')
+
+    # K and Ks share the 2MASS Ks curve.
+    names = ['K', 'Ks', 'J']
+    offsets = []
+    for cached in [False, True]:
+        filters = Filters(name='filters', pool=SerialPool())
+        filters._dir_path = dir_path
+        filters.CACHE_PATH = cache_path
+        if cached:
+            filters.read_filter = parse
+            for name in names:
+                filters.load_bands([(name, '', '', '')])
+        else:
+            filters.load_bands([(x, '', '', '') for x in names])
+        offsets.append(
+            [filters._band_offsets[filters.find_band_index(x)]
+             for x in names])
+        assert os.path.exists(cache_path)
+
+    zpfluxes = []
+    for system in ['AB', 'Vega']:
+        vo_tab = voparse(os.path.join(
+            dir_path, 'filters', '2MASS_2MASS.Ks_' + system + '.xml'))
+        zpfluxes.extend([x.value for x in vo_tab.resources[0].params
+                         if x.name == 'ZeroPoint'])
+    ks_offset = 2.5 * np.log10(zpfluxes[0] / zpfluxes[1])
+    assert offsets[0] == offsets[1]
+    # Every band sharing the curve gets the zero point of its system.
+    assert offsets[0][0] == offsets[0][1] == ks_offset
+    assert offsets[0][2] not in [0.0, ks_offset]
+
+
+def lookup_errors(filters, temperatures, av_host, redshift, ebv):
+    """Return the differences between the magnitudes of blackbodies in
+    lookup mode and those integrated from their SEDs, for the observations
+    of OBS_BANDS with photosphere temperatures `temperatures`.
+    """
+    wavelengths = sample_wavelengths(filters, SED.N_PTS)
+    extinction = Extinction(name='extinction', pool=None)
+    extinction.handle_requests(filters=filters, samplewavelengths=wavelengths)
+    rows = np.array([wavelengths[x]
+                     for x in filters.find_band_indices(OBS_BANDS)])
+    rest_freqs = SED.C_CONST / rows * (1.0 + redshift)
+    with np.errstate(over='ignore'):
+        seds = blackbody.FLUX_CONST * rest_freqs**3 / np.expm1(
+            blackbody.X_CONST * rest_freqs / temperatures[:, None])
+    kwargs = dict(all_bands=OBS_BANDS, samplewavelengths=wavelengths,
+                  lumdist=LUM_DIST, luminosities=None, systems=None,
+                  instruments=None, bandsets=None, radiusphot=np.ones(len(
+                      OBS_BANDS)), temperaturephot=temperatures,
+                  redshift=redshift, ebv=ebv,
+                  nhhost=av_host * Extinction.NH_PER_AV)
+    seds = extinction.process(seds=seds, **kwargs)['seds']
+    integrated = filters.process(seds=seds, **kwargs)['model_magnitudes']
+    looked_up = filters.process(seds=None, **kwargs)['model_magnitudes']
+    return looked_up - integrated
+
+
+def test_lookup_accuracy():
+    filters = load_filters()
+    rng = np.random.RandomState(0)
+    temperatures = 10.0**rng.uniform(np.log10(1.5e3), 7.0, size=(20, len(
+        OBS_BANDS)))
+    for redshift, ebv in [(0.0096, 0.0226), (0.2, 0.1)]:
+        for av_host in [0.0, 1.0, 30.0]:
+            for temps in temperatures:
+                assert np.all(np.abs(lookup_errors(
+                    filters, temps, av_host, redshift, ebv)) < 5.0e-4)
+    # Cool photospheres, and bands observing the rest-frame UV.
+    for temps, redshift in [(np.full(len(OBS_BANDS), 1.1e3), 0.0),
+                            (temperatures[0], 1.0)]:
+        errors = np.abs(lookup_errors(filters, temps, 1.0, redshift, 0.0226))
+        assert np.all(errors < (1.0e-3 if redshift == 0.0 else 5.0e-3))
+
+
+def test_lookup_grid():
+    filters = load_filters()
+    temperatures = np.linspace(3.0e3, 3.0e4, len(OBS_BANDS))
+    # Free redshifts and E(B-V) are interpolated on grids, and the number of
+    # tables is bounded.
+    filters.set_free_inputs(['redshift', 'ebv'])
+    for ebv in np.linspace(0.0, 0.3, 7):
+        assert np.all(np.abs(lookup_errors(
+            filters, temperatures, 1.0, 0.05, ebv)) < 5.0e-4)
+    for redshift in np.linspace(0.01, 0.5, 2 * Filters.LOOKUP_CACHE_SIZE):
+        assert np.all(np.abs(lookup_errors(
+            filters, temperatures, 1.0, redshift, 0.0)) < 5.0e-4)
+    assert len(filters._lookup_tables) <= Filters.LOOKUP_CACHE_SIZE
+
+
+def test_lookup_deterministic():
+    temperatures = np.linspace(3.0e3, 3.0e4, len(OBS_BANDS))
+    for free in [[], ['redshift', 'ebv']]:
+        # Magnitudes do not depend upon what was evaluated before.
+        errors = []
+        for values in [[0.1], np.linspace(0.01, 0.3, 9).tolist() + [0.1]]:
+            filters = load_filters()
+            filters.set_free_inputs(free)
+            for value in values:
+                errors.append(lookup_errors(
+                    filters, temperatures, 1.0, value, value))
+        assert np.array_equal(errors[0], errors[-1])
+        if free:
+            # Interpolated between tables of grid points.
+            zs = np.array([x[0] for x in filters._lookup_tables])
+            assert np.allclose(zs / Filters.LOOKUP_DZ,
+                               np.round(zs / Filters.LOOKUP_DZ))
+        else:
+            assert list(filters._lookup_tables)[-1] == (0.1, 0.1)
@@ -0,0 +1,314 @@
+"""Tests of model evaluation on the bundled SN2006le data.
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+from schwimmbad import SerialPool
+
+from mosfit.fitter import Fitter
+from mosfit.constants import LIKELIHOOD_FLOOR
+from mosfit.model import Model
+from mosfit.modules.objectives.likelihood import Likelihood
+from mosfit.utils import json_default
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'SN2006le.json')
+
+
+def load_fitter(model='default', parameter_path='parameters.json'):
+    """Return a fitter with the SN2006le data loaded.
+    """
+    fitter = Fitter()
+    fitter._model = Model(
+        model=model, parameter_path=parameter_path, pool=SerialPool())
+    with open(DATA_PATH, 'r') as f:
+        data = json.loads(f.read())
+    fitter.load_data(data, event_name='SN2006le', extrapolate_time=[0.0])
+    return fitter
+
+
+def load_model(model='default', parameter_path='parameters.json'):
+    """Return a model with the SN2006le data loaded.
+    """
+    return load_fitter(model, parameter_path)._model
+
+
+@pytest.fixture(scope='module')
+def model():
+    return load_model()
+
+
+def test_rerun_after_error(model):
+    rng = np.random.RandomState(0)
+    # Parameters with finite, distinct scores.
+    x0, x1 = rng.uniform(size=(4, model._num_free_parameters))[2:]
+    score0 = model.likelihood(x0)
+    score1 = model.likelihood(x1)
+    assert np.isfinite(score0) and np.isfinite(score1) and score0 != score1
+    model.likelihood(x0)
+
+    def fail_at(x):
+        """Evaluate `x` with a module that raises partway through the stack,
+        after the modules before it were updated.
+        """
+        module = model._modules['diffusion']
+
+        def fail(**kwargs):
+            raise ValueError
+
+        module.process = fail
+        try:
+            with pytest.raises(ValueError):
+                model.likelihood(x)
+        finally:
+            del module.process
+
+    # Retrying the same parameters.
+    fail_at(x1)
+    assert model.likelihood(x1) == score1
+    # Going back to the parameters of the last successful evaluation.
+    fail_at(x0)
+    assert model.likelihood(x1) == score1
+    assert model.likelihood(x0) == score0
+
+
+@pytest.mark.parametrize('name', ['default', 'magnetar', 'csm', 'slsn',
+                                  'magni'])
+def test_batch_matches_stack(name):
+    batch_model = load_model(name)
+    rng = np.random.RandomState(1)
+    xs = rng.uniform(size=(30, batch_model._num_free_parameters))
+    outputs = batch_model.run_batch(xs)
+    rows = [batch_model.run_stack(x) for x in xs]
+    # Batched powers may differ from scalar ones in the last bit.
+    for key in ['value', 'model_magnitudes']:
+        np.testing.assert_allclose(
+            outputs[key], np.array([x[key] for x in rows]), rtol=1.0e-12,
+            atol=0.0)
+    assert np.sum(np.isfinite(outputs['value'])) >= 5
+
+
+@pytest.mark.parametrize('name', ['default', 'magnetar'])
+def test_batch_calls(name, monkeypatch):
+    batch_model = load_model(name)
+    rng = np.random.RandomState(1)
+    xs = rng.uniform(size=(10, batch_model._num_free_parameters))
+    batch_model.run_batch(xs[:1])
+    calls = {}
+    for task, module in batch_model._modules.items():
+        def counted(_process=module.process, _task=task, **kwargs):
+            calls[_task] = calls.get(_task, 0) + 1
+            return _process(**kwargs)
+
+        monkeypatch.setattr(module, 'process', counted)
+    batch_model.run_batch(xs)
+    # Every module of these models runs once for all walkers.
+    assert calls and set(calls.values()) == set([1])
+    assert 'diffusion' in calls and 'filters' in calls
+
+
+def test_output_value(model):
+    # The output root takes the likelihood as an input, so it carries the
+    # score of the objective.
+    rng = np.random.RandomState(1)
+    xs = rng.uniform(size=(30, model._num_free_parameters))
+    scores = [model.run_stack(x)['value'] for x in xs]
+    values = [model.run_stack(x, root='output')['value'] for x in xs]
+    assert np.sum(np.isfinite(scores)) >= 5
+    assert values == scores
+
+
+def test_fit_data_walkers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # emcee 2 still uses the `np.float` alias removed from numpy.
+    monkeypatch.setattr(np, 'float', float, raising=False)
+    np.random.seed(0)
+    fitter = load_fitter()
+    fitter._travis = False
+    model = fitter._model
+    roots = []
+    run_stack = model.run_stack
+
+    def counted(x, root='objective'):
+        roots.append(root)
+        return run_stack(x, root)
+
+    monkeypatch.setattr(model, 'run_stack', counted)
+    fitter.fit_data(event_name='SN2006le', iterations=2, num_walkers=24,
+                    num_temps=1, fracking=False, pool=SerialPool())
+    with open(os.path.join(model.MODEL_OUTPUT_DIR, 'walkers.json')) as f:
+        walkers = json.loads(f.read())
+    assert len(walkers) == 24
+    # The walkers are written from one batch of the output stack, the
+    # single run of the stack only binds its plan. Within the batch the
+    # modules that do not depend on the free parameters are reused.
+    assert roots.count('output') == 1
+    stats = model.cache_stats('output')
+    assert stats['fitlc'] == {'hits': 0, 'misses': 1 + 24}
+    assert stats['alltimes'] == {'hits': 24, 'misses': 1}
+    for walker in walkers.values():
+        x = [walker['parameters'][task]['fraction']
+             for task in model._free_parameters]
+        output = model.run_stack(x, root='output')
+        for key in ['value', 'model_magnitudes']:
+            np.testing.assert_allclose(
+                walker[key], output[key], rtol=1.0e-12, atol=0.0)
+
+
+def test_output_missing_values(model):
+    # Missing data values are NaN in the model, but written as in the data.
+    output = model.run_stack(
+        np.full(model._num_free_parameters, 0.5), root='output')
+    assert np.all(np.isnan(output['e_upper_magnitudes']))
+    magnitudes = output['magnitudes'].tolist()
+    model._modules['transient'].blank_missing(output)
+    assert output['e_upper_magnitudes'] == [''] * len(magnitudes)
+    text = json.dumps(output, default=json_default)
+    assert 'NaN' not in text
+    assert json.loads(text)['magnitudes'] == magnitudes
+
+
+def scalar_likelihood(kwargs):
+    """Return the score of the former scalar implementation of the
+    likelihood, whose missing errors were `''`.
+    """
+    blank = [[('' if np.isnan(x) else x) for x in kwargs[key]]
+             for key in ['e_magnitudes', 'e_upper_magnitudes',
+                         'e_lower_magnitudes']]
+    ul = kwargs['upperlimits']
+    model_mags = kwargs['model_magnitudes']
+    if (min(kwargs['fractions']) < 0.0 or max(kwargs['fractions']) > 1.0):
+        return LIKELIHOOD_FLOOR
+    for mi, mag in enumerate(model_mags):
+        if not ul[mi] and not np.isfinite(mag):
+            return LIKELIHOOD_FLOOR
+    e_u_mags = [
+        kwargs['default_upper_limit_error']
+        if (e == '' and eu == '' and ul[i]) else
+        (kwargs['default_no_error_bar_error']
+         if (e == '' and eu == '') else (e if eu == '' else eu))
+        for i, (e, eu) in enumerate(zip(blank[0], blank[1]))
+    ]
+    e_l_mags = [
+        0.0 if ul[i] else
+        (kwargs['default_no_error_bar_error']
+         if (e == '' and el == '') else (e if el == '' else el))
+        for i, (e, el) in enumerate(zip(blank[0], blank[2]))
+    ]
+    variance2 = kwargs['variance']**2
+    observed = kwargs['observed']
+    sum_members = [
+        (x - y if not u or (x < y and not np.isnan(x)) else 0.0)**2 / (
+            (el if x > y else eu)**2 + variance2) +
+        np.log(variance2 + 0.5 * (el**2 + eu**2))
+        for x, y, eu, el, u in zip(
+            model_mags, [i for i, o in zip(kwargs['magnitudes'], observed)
+                         if o],
+            [i for i, o in zip(e_u_mags, observed) if o],
+            [i for i, o in zip(e_l_mags, observed) if o],
+            [i for i, o in zip(ul, observed) if o])
+    ]
+    value = -0.5 * np.sum(sum_members)
+    return LIKELIHOOD_FLOOR if np.isnan(value) else value
+
+
+def test_likelihood_matches_scalar():
+    # A fresh model, so that the likelihood is not skipped as unchanged.
+    model = load_model()
+    module = model._modules['likelihood']
+    inputs = []
+
+    def capture(**kwargs):
+        inputs.append(kwargs)
+        return Likelihood.process(module, **kwargs)
+
+    module.process = capture
+    try:
+        # Parameters with a finite score.
+        model.run_stack(np.random.RandomState(0).uniform(
+            size=(4, model._num_free_parameters))[2])
+    finally:
+        del module.process
+    kwargs = dict(inputs[0])
+    rng = np.random.RandomState(2)
+
+    # Upper limits, asymmetric errors and missing errors, on the data of
+    # SN2006le.
+    nobs = len(kwargs['magnitudes'])
+    model_mags = np.array(kwargs['model_magnitudes'])
+    ul = rng.uniform(size=nobs) < 0.2
+    mags = np.where(ul, model_mags + rng.normal(scale=0.5, size=nobs),
+                    kwargs['magnitudes'])
+    e_mags = np.where(rng.uniform(size=nobs) < 0.2, np.nan,
+                      kwargs['e_magnitudes'])
+    asym = rng.uniform(size=nobs) < 0.3
+    e_u_mags = np.where(asym, rng.uniform(0.01, 0.3, size=nobs), np.nan)
+    e_l_mags = np.where(asym & (rng.uniform(size=nobs) < 0.7),
+                        rng.uniform(0.01, 0.3, size=nobs), np.nan)
+    kwargs.update(magnitudes=mags, e_magnitudes=e_mags,
+                  e_upper_magnitudes=e_u_mags, e_lower_magnitudes=e_l_mags,
+                  upperlimits=ul)
+    assert np.any(ul & np.isnan(e_mags)) and np.any(~ul & np.isnan(e_mags))
+
+    likelihood = Likelihood(name='likelihood', pool=None)
+    nan_ul = model_mags.copy()
+    nan_ul[np.argmax(ul)] = np.nan
+    nan_detected = model_mags.copy()
+    nan_detected[np.argmin(ul)] = np.nan
+    cases = [(model_mags, 0.1), (model_mags + 0.3, 0.02), (nan_ul, 0.1),
+             (nan_detected, 0.1)]
+    for mm, variance in cases:
+        kwargs.update(model_magnitudes=mm, variance=variance)
+        assert likelihood.process(**kwargs)['value'] == scalar_likelihood(
+            kwargs)
+    # Scores of walkers, any leading axis is over walkers.
+    values = likelihood.process(**dict(
+        kwargs, model_magnitudes=np.array([x[0] for x in cases]),
+        variance=np.array([x[1] for x in cases]),
+        fractions=np.tile(kwargs['fractions'], (len(cases), 1))))['value']
+    for value, (mm, variance) in zip(values, cases):
+        assert value == scalar_likelihood(
+            dict(kwargs, model_magnitudes=mm, variance=variance))
+    assert np.all(np.isfinite(values[:-1])) and values[-1] == LIKELIHOOD_FLOOR
+
+
+def test_prior_matches_modules():
+    prior_model = load_model(parameter_path='parameters_test.json')
+    modules = [prior_model._modules[x] for x in prior_model._free_parameters]
+    classes = set(type(x).__name__ for x in modules)
+    assert {'Gaussian', 'PowerLaw'} <= classes
+    rng = np.random.RandomState(3)
+    xs = rng.uniform(size=(20, len(modules)))
+    # Including the edges, power law priors diverge at the lower one.
+    xs[0] = 0.0
+    xs[1] = 1.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = [np.sum([m.lnprior_pdf(y) for m, y in zip(modules, x)])
+                    for x in xs]
+        values = [prior_model.prior(x) for x in xs]
+        np.testing.assert_allclose(values, expected, rtol=1.0e-12)
+        np.testing.assert_allclose(prior_model.prior(xs), expected,
+                                   rtol=1.0e-12)
+    assert np.all(np.isfinite(expected[1:]))
+
+
+def test_profile_parameter_values():
+    profiled = load_model()
+    profiled.enable_profiling()
+    x = np.full(profiled._num_free_parameters, 0.5)
+    profiled.likelihood(x)
+    profiled.likelihood(np.tile(x, (3, 1)))
+    profiler = profiled.profiler()
+    # Free parameters are mapped without calling their modules.
+    assert profiler.calls('Model.parameter_values') == 2
+    assert profiler.calls('fnickel') == 0
+    assert 'Model.parameter_values' in profiler.report()
+
+
+def test_free_inputs(model):
+    # The redshift and E(B-V) of SN2006le are fixed by its data.
+    free = model._modules['filters']._free_inputs
+    assert {'extinction', 'blackbody', 'nhhost'} <= free
+    assert not free & {'redshift', 'ebv', 'lumdist', 'transient'}
@@ -7,6 +7,11 @@ import sys
 from math import floor, log10
 from textwrap import wrap
 
+import numpy as np
+
+# `np.trapz` was renamed `np.trapezoid` in numpy 2.0, and later removed.
+trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
 if sys.version_info[:2] < (3, 3):
     old_print = print
 
@@ -44,6 +49,39 @@ def listify(x):
     return x
 
 
+def json_default(x):
+    """Convert numpy arrays and scalars to types `json` can serialize.
+    """
+    if hasattr(x, 'tolist'):
+        return x.tolist()
+    raise TypeError('{} is not JSON serializable'.format(repr(x)))
+
+
+def bcast_arrays(pool, arrays=None):
+    """Broadcast a list of 1D numpy arrays from the master process to every
+    other process in `pool`. The arrays are packed into a single buffer and
+    sent with one collective call. Returns the list of arrays on every
+    process; only the master needs to pass `arrays`.
+    """
+    if not pool.size:
+        return arrays
+    meta = None
+    if pool.is_master():
+        arrays = [np.asarray(x) for x in arrays]
+        dtype = np.result_type(*arrays) if arrays else np.float64
+        meta = ([len(x) for x in arrays], np.dtype(dtype).str)
+    lengths, dtype = pool.comm.bcast(meta, root=0)
+    if pool.is_master():
+        buf = (np.concatenate(arrays).astype(dtype)
+               if arrays else np.empty(0, dtype=dtype))
+    else:
+        buf = np.empty(sum(lengths), dtype=dtype)
+    pool.comm.Bcast(buf, root=0)
+    if pool.is_master():
+        return arrays
+    return np.split(buf, np.cumsum(lengths)[:-1]) if lengths else []
+
+
 def print_inline(x, new_line=False):
     lines = x.split('\n')
     if not new_line: